@@ -0,0 +1,104 @@
+"""Time scoring with the trained forest under every inference engine, from single rows to large batches.
+
+Run from the repository root, e.g.
+
+    python -m benchmarks.inference --sizes 1 100 10000 1000000
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import sklearn
+import yaml
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.run_benchmarks import make_synthetic, git_commit
+from src.feature_generation import feature_gen, compute_features
+from src.tree_inference import ENGINES, flatten_model
+
+
+def available_engines() -> list:
+    """List the engines that can run here; 'numba' needs numba installed.
+
+    :return: list - engine names
+    """
+    engines = []
+    for engine in ENGINES:
+        try:
+            flatten_model(RandomForestClassifier(n_estimators=1).fit([[0.0], [1.0]], [0, 1]), engine)
+        except ImportError:
+            print(f'Skipping the {engine} engine: it is not installed.')
+            continue
+        engines.append(engine)
+    return engines
+
+
+def run(sizes: list, config: dict, engines: list, train_rows: int = 10 ** 5, repeat: int = 5) -> list:
+    """Fit the configured forest on synthetic data and time `predict_proba` per engine and batch size.
+
+    :param sizes: list - batch sizes, in rows
+    :param config: dict - pipeline config
+    :param engines: list - engine names, see `src.tree_inference.ENGINES`
+    :param train_rows: int - number of rows the forest is fitted on
+    :param repeat: int - number of timed runs per engine and size; the fastest is reported
+    :return: list - one dict per engine and size with 'seconds', 'latency_ms' and 'rows_per_sec'
+    """
+    features_list = config['train_model']['fit_model']['features_list']
+    columns = config['load_data']['columns']
+
+    def matrix(n_rows, seed):
+        features, labels = feature_gen(make_synthetic(n_rows, columns, seed))
+        computed = compute_features(features, features_list)
+        return np.column_stack([computed[name] for name in features_list]), labels.to_numpy()
+
+    X_train, y_train = matrix(train_rows, 42)
+    model = RandomForestClassifier(**config['train_model']['model_params']).fit(X_train, y_train)
+    X, _ = matrix(max(sizes), 0)
+
+    results = []
+    for engine in engines:
+        scorer = flatten_model(model, engine)
+        # warm up: the numba kernel compiles on its first call
+        scorer.predict_proba(X[:1])
+        for n_rows in sizes:
+            batch = X[:n_rows]
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                scorer.predict_proba(batch)
+                times.append(time.perf_counter() - start)
+            seconds = min(times)
+            results.append({'engine': engine, 'n_rows': n_rows, 'seconds': seconds, 'latency_ms': seconds * 1000,
+                            'rows_per_sec': n_rows / seconds if seconds > 0 else None})
+            print('%-8s %10d rows %12.3f ms %14.0f rows/s' % (engine, n_rows, seconds * 1000, n_rows / seconds))
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="benchmark the forest inference engines on synthetic cloud data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6],
+                        help='batch sizes to benchmark')
+    parser.add_argument('--engines', nargs='+', default=None, help='engines to run (default: all installed)')
+    parser.add_argument('--train-rows', type=int, default=10 ** 5, help='rows the forest is fitted on')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per engine and size')
+    parser.add_argument('--config', default='config/config.yaml', help='path to config yaml file')
+    parser.add_argument('--output', '-o', default=None,
+                        help='results JSON path (default: benchmarks/results/inference_<commit>.json)')
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+    results = run(args.sizes, config, args.engines or available_engines(), args.train_rows, args.repeat)
+    commit = git_commit()
+    output = args.output or os.path.join('benchmarks', 'results', f'inference_{commit}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'commit': commit, 'timestamp': datetime.datetime.now().isoformat(),
+                   'python': platform.python_version(), 'numpy': np.__version__, 'sklearn': sklearn.__version__,
+                   'results': results}, f, indent=2)
+    print(f'Results saved to {output}.')
@@ -0,0 +1,221 @@
+"""Time and memory-profile every pipeline stage on synthetic cloud data of increasing size.
+
+Run from the repository root, e.g.
+
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 1000000
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.data_acquisition import load_data
+from src.evaluate_model import evaluation
+from src.feature_generation import feature_gen, add_log_entropy, add_entropy_x_contrast, add_ir_range, \
+    add_ir_norm_range, compute_features
+from src.schema import apply_schema, build_schema
+from src.train_model import train_test_split, fit_model
+
+# per-column mean and spread of the UCI sample, used to draw cloud-shaped synthetic rows
+COLUMN_STATS = {
+    'visible_mean': (4.0, 2.0), 'visible_max': (160.0, 30.0), 'visible_min': (55.0, 25.0),
+    'visible_mean_distribution': (0.08, 0.02), 'visible_contrast': (700.0, 200.0),
+    'visible_entropy': (0.03, 0.015), 'visible_second_angular_momentum': (3.8, 0.3),
+    'IR_mean': (160.0, 10.0), 'IR_max': (238.0, 3.0), 'IR_min': (205.0, 15.0)
+}
+
+
+def make_synthetic(n_rows: int, columns: list, seed: int = 42) -> pd.DataFrame:
+    """Draw cloud data with the `load_data` schema: two equally sized clouds labelled 0 and 1.
+
+    :param n_rows: int - number of rows
+    :param columns: list - input columns, see 'load_data.columns' in the config
+    :param seed: int - random state
+    :return: :obj: pandas dataframe - synthetic data with a 'class' column
+    """
+    rng = np.random.RandomState(seed)
+    labels = (np.arange(n_rows) >= n_rows // 2).astype(np.float64)
+    data = {}
+    for column in columns:
+        mean, std = COLUMN_STATS[column]
+        # shift the second cloud so the classes are separable but overlap
+        data[column] = np.abs(rng.normal(mean, std, n_rows) + labels * 0.5 * std)
+    data['class'] = labels
+    return apply_schema(pd.DataFrame(data), build_schema(columns))
+
+
+def write_raw(path: str, data: pd.DataFrame, columns: list) -> None:
+    """Write synthetic data as a raw text file laid out like the UCI cloud.data file.
+
+    :param path: str - output path
+    :param data: :obj: pandas dataframe - output of `make_synthetic`
+    :param columns: list - input columns
+    :return: None
+    """
+    with open(path, 'w') as f:
+        f.write('Synthetic cloud data\n\n')
+        for label in [0.0, 1.0]:
+            f.write(f'Cloud {int(label) + 1}\n\n')
+            np.savetxt(f, data.loc[data['class'] == label, columns].values, fmt='%12.6f', delimiter='')
+            f.write('\n')
+
+
+def measure(func, repeat: int = 1) -> dict:
+    """Run a function, recording its best wall time and the peak memory it allocated.
+
+    :param func: callable - takes no arguments
+    :param repeat: int - number of timed runs; the fastest is reported
+    :return: dict - 'seconds' and 'peak_mb'
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        times.append(time.perf_counter() - start)
+    # a separate traced run, since tracemalloc slows allocation-heavy code down
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(times), 'peak_mb': peak / 2 ** 20}
+
+
+def stages(n_rows: int, config: dict, workdir: str) -> dict:
+    """Set up the inputs of every stage for one data size.
+
+    :param n_rows: int - number of rows
+    :param config: dict - pipeline config
+    :param workdir: str - directory for the raw text file
+    :return: dict - stage name -> callable running the stage
+    """
+    columns = config['load_data']['columns']
+    features_list = config['train_model']['fit_model']['features_list']
+    data = make_synthetic(n_rows, columns)
+    raw_path = os.path.join(workdir, f'cloud_{n_rows}.data')
+    write_raw(raw_path, data, columns)
+
+    features, labels = feature_gen(data)
+    featurized = add_ir_norm_range(add_ir_range(add_entropy_x_contrast(add_log_entropy(features.copy()))))
+    X_train, X_test, y_train, y_test = train_test_split(featurized, labels, **config['train_model']['train_test_split'])
+    # evaluation cost does not depend on the model, so score it on random predictions rather than fitting here
+    proba = np.random.RandomState(0).uniform(size=len(y_test))
+    pred = pd.DataFrame({'ypred_proba': proba, 'ypred_bin': (proba > 0.5).astype(np.float64)})
+
+    return {
+        'load_data': lambda: load_data(raw_path, **config['load_data']),
+        'feature_gen': lambda: feature_gen(data),
+        'add_log_entropy': lambda: add_log_entropy(features.copy()),
+        'add_entropy_x_contrast': lambda: add_entropy_x_contrast(features.copy()),
+        'add_ir_range': lambda: add_ir_range(features.copy()),
+        'add_ir_norm_range': lambda: add_ir_norm_range(features.copy()),
+        'compute_features': lambda: compute_features(features, features_list),
+        'train_test_split': lambda: train_test_split(featurized, labels, **config['train_model']['train_test_split']),
+        'fit_model': lambda: fit_model(X_train, y_train, X_test, features_list, **config['train_model']['model_params']),
+        'evaluation': lambda: evaluation(y_test, pred)
+    }
+
+
+def run(sizes: list, config: dict, selected: list = None, max_fit_rows: int = 10 ** 6, repeat: int = 3,
+        workdir: str = 'benchmarks/tmp') -> list:
+    """Benchmark the selected stages at every size.
+
+    :param sizes: list - numbers of rows
+    :param config: dict - pipeline config
+    :param selected: list - stage names to run; all if None
+    :param max_fit_rows: int - largest size at which 'fit_model' is run
+    :param repeat: int - number of timed runs per stage and size
+    :param workdir: str - directory for temporary raw text files
+    :return: list - one dict per stage and size with 'seconds', 'peak_mb' and 'rows_per_sec'
+    """
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    for n_rows in sizes:
+        for name, func in stages(n_rows, config, workdir).items():
+            if (selected and name not in selected) or (name == 'fit_model' and n_rows > max_fit_rows):
+                continue
+            result = dict(stage=name, n_rows=n_rows, **measure(func, repeat))
+            result['rows_per_sec'] = n_rows / result['seconds'] if result['seconds'] > 0 else None
+            results.append(result)
+            print('%-24s %10d rows %10.4f s %10.1f MB' % (name, n_rows, result['seconds'], result['peak_mb']))
+        os.remove(os.path.join(workdir, f'cloud_{n_rows}.data'))
+    os.rmdir(workdir)
+    return results
+
+
+def git_commit() -> str:
+    """Get the short hash of the checked-out commit, which results are saved under.
+
+    :return: str - short commit hash, or 'unknown' outside a git checkout
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(old_path: str, new_path: str, threshold: float = 1.1) -> list:
+    """Print the time and memory ratio of each stage between two result files.
+
+    :param old_path: str - baseline results JSON
+    :param new_path: str - new results JSON
+    :param threshold: float - time ratio above which a stage is flagged as a regression
+    :return: list - (stage, n_rows, time ratio) of flagged regressions
+    """
+    with open(old_path) as f:
+        old = {(r['stage'], r['n_rows']): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {(r['stage'], r['n_rows']): r for r in json.load(f)['results']}
+
+    regressions = []
+    for key in sorted(set(old) & set(new)):
+        time_ratio = new[key]['seconds'] / old[key]['seconds']
+        memory_ratio = new[key]['peak_mb'] / old[key]['peak_mb'] if old[key]['peak_mb'] else float('nan')
+        flag = 'REGRESSION' if time_ratio > threshold else ''
+        print('%-24s %10d rows  time x%.2f  memory x%.2f  %s' % (key + (time_ratio, memory_ratio, flag)))
+        if flag:
+            regressions.append(key + (time_ratio,))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="benchmark every pipeline stage on synthetic cloud data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7],
+                        help='numbers of rows to benchmark')
+    parser.add_argument('--stages', nargs='+', default=None, help='stages to run (default: all)')
+    parser.add_argument('--max-fit-rows', type=int, default=10 ** 6, help="largest size at which fit_model runs")
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage and size')
+    parser.add_argument('--config', default='config/config.yaml', help='path to config yaml file')
+    parser.add_argument('--output', '-o', default=None,
+                        help='results JSON path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), default=None,
+                        help='compare two results files instead of running benchmarks')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        with open(args.config, "r") as f:
+            config = yaml.safe_load(f)
+        results = run(args.sizes, config, args.stages, args.max_fit_rows, args.repeat)
+        commit = git_commit()
+        output = args.output or os.path.join('benchmarks', 'results', f'{commit}.json')
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump({'commit': commit, 'timestamp': datetime.datetime.now().isoformat(),
+                       'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                       'results': results}, f, indent=2)
+        print(f'Results saved to {output}.')
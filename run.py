@@ -1,98 +1,217 @@
-import argparse
-import logging
-
-import yaml
-import pandas as pd
-
-from src.data_acquisition import save_data, load_data
-from src.feature_generation import feature_gen, add_ir_norm_range,\
-    add_ir_range, add_log_entropy, add_entropy_x_contrast
-from src.train_model import train_test_split, fit_model
-from src.evaluate_model import evaluation
-
-logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p', level='INFO')
-logger = logging.getLogger(__name__)
-
-
-if __name__ == '__main__':
-
-    parser = argparse.ArgumentParser(description="load data, create features, and run models on cloud data")
-
-    parser.add_argument('step', help='Which step to run', choices=['acquire', 'read', 'featurize', 'train', 'evaluate'])
-    parser.add_argument('--input', '-i', default=None, help='input filepath')
-    parser.add_argument('--config', default='config/config.yaml', help='path to config yaml file')
-    parser.add_argument('--output', '-o', default=None, help='output filepath')
-
-    args = parser.parse_args()
-
-    with open(args.config, "r") as f:
-        config = yaml.safe_load(f)
-
-    # save data (to raw text file)
-    if args.step == 'acquire':
-        output = save_data(**config["save_data"])
-
-    # read data
-    elif args.step == 'read':
-        with open(args.input, 'r') as f:
-            data = [[s for s in line.split(' ') if s != ''] for line in f.readlines()]
-        output = load_data(data, **config["load_data"])
-
-    # feature generation
-    elif args.step == 'featurize':
-        data = pd.read_csv(args.input)
-        feature_config = config["generate_features"]
-
-        # users have the option to specify output paths and download granular feature files
-        features, labels = feature_gen(data)
-        if "features_output_path" in feature_config["feature_gen"] and \
-           "labels_output_path" in feature_config["feature_gen"]:
-            features.to_csv(feature_config["feature_gen"]["features_output_path"], index=False)
-            labels.to_csv(feature_config["feature_gen"]["labels_output_path"], index=False)
-
-        features = add_log_entropy(features)
-        if "output_path" in feature_config["add_log_entropy"]:
-            features.to_csv(feature_config["add_log_entropy"]["output_path"], index=False)
-
-        features = add_entropy_x_contrast(features)
-        if "output_path" in feature_config["add_entropy_x_contrast"]:
-            features.to_csv(feature_config["add_entropy_x_contrast"]["output_path"], index=False)
-
-        features = add_ir_range(features)
-        if "output_path" in feature_config["add_ir_range"]:
-            features.to_csv(feature_config["add_ir_range"]["output_path"], index=False)
-
-        features = add_ir_norm_range(features)
-        if "output_path" in feature_config["add_ir_norm_range"]:
-            features.to_csv(feature_config["add_ir_norm_range"]["output_path"], index=False)
-
-        output = pd.concat([features, labels], axis=1)
-
-    # model training
-    elif args.step == 'train':
-        data = pd.read_csv(args.input)
-        model_config = config["train_model"]
-        features, labels = feature_gen(data)
-        X_train, X_test, y_train, y_test = train_test_split(features, labels,
-                                                            **model_config['train_test_split'])
-        pred = fit_model(X_train, y_train, X_test, **model_config['fit_model'], **model_config['model_params'])
-
-        output = pd.concat([pred.reset_index(drop=True), y_test.reset_index(drop=True)], axis=1)
-
-    # model evaluation
-    elif args.step == 'evaluate':
-        data = pd.read_csv(args.input)
-        pred, y_test = feature_gen(data)
-        evaluation(y_test, pred)
-        output = None
-
-    if args.output is not None:
-        if type(output) == str and output != '':
-            with open(args.output, 'w') as text:
-                text.write(output)
-                logger.info(f'Output saved to {args.output}.')
-        elif type(output) == pd.DataFrame:
-            output.to_csv(args.output, index=False)
-            logger.info(f'Output saved to {args.output}.')
-        else:
-            logger.error(f'Error: Output in questionable format.')
+import argparse
+import logging
+
+import yaml
+
+from src.cache import StepCache, hash_file
+from src.profiling import configure, cprofile, profiler, stage
+
+logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S %p', level='INFO')
+logger = logging.getLogger(__name__)
+
+STEPS = ['acquire', 'read', 'featurize', 'train', 'evaluate', 'update', 'tune', 'predict', 'serve', 'all', 'experiment']
+
+
+def main(argv: list = None) -> None:
+    """Run one step of the pipeline from the command line.
+
+    Each step imports only the modules it uses, so steps that do not fit or load a model (e.g. `acquire`, `read`,
+    `featurize` and `evaluate`) start without importing sklearn, and `acquire` without pandas either.
+
+    :param argv: list - command line arguments; defaults to sys.argv[1:]
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="load data, create features, and run models on cloud data")
+
+    parser.add_argument('step', help='Which step to run', choices=STEPS)
+    parser.add_argument('--input', '-i', default=None, help='input filepath')
+    parser.add_argument('--config', default='config/config.yaml', help='path to config yaml file')
+    parser.add_argument('--output', '-o', default=None, help='output filepath')
+    parser.add_argument('--save-intermediate', action='store_true',
+                        help="with step 'all', also write the intermediate outputs set in the config")
+    parser.add_argument('--experiments', default='config/experiments.yaml',
+                        help="with step 'experiment', path to the yaml file of config overrides to compare")
+    parser.add_argument('--profile', action='store_true',
+                        help="record per-stage time, memory and throughput to 'profiling.metrics_path'")
+    parser.add_argument('--cprofile', default=None, help='also dump cProfile stats of the step to this path')
+
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        config = yaml.safe_load(f)
+    fmt = config.get("artifacts", {}).get("format", "auto")
+    # float32 features and an int8 label in a fixed column order, whatever the artifact format infers
+    schema = None
+    if args.step in ['read', 'featurize', 'train', 'evaluate', 'update', 'tune', 'predict', 'all']:
+        from src.schema import build_schema
+        schema = build_schema(config["load_data"]["columns"])
+    cache = StepCache(**config.get("cache", {"enabled": False}))
+
+    # reuse the output of a previous run with the same input, config subsections and code
+    key = None
+    hit = False
+    if cache.enabled and args.step in ['read', 'featurize', 'train'] and args.output is not None:
+        from src.artifacts import resolve_format
+        from src.pipeline import cache_key, side_output_paths
+        key = cache_key(args.step, hash_file(args.input), config, resolve_format(args.output, fmt))
+        # the files a step writes besides its output (feature snapshots, saved model) are cached and restored with it
+        cached_paths = dict(side_output_paths(args.step, config), output=args.output)
+        hit = cache.get_files(key, cached_paths)
+    output = None
+    data = None
+
+    profile_config = config.get("profiling", {})
+    configure(profile_config.get("metrics_path"), args.profile or profile_config.get("enabled", False))
+
+    with cprofile(args.cprofile), stage(args.step) as record:
+        if hit:
+            logger.info(f'Step {args.step} skipped, output unchanged.')
+
+        # download the raw text files, skipping unchanged ones and resuming interrupted ones
+        elif args.step == 'acquire':
+            from src.data_acquisition import download_files
+            download_files(**config["acquire"])
+
+        # read data
+        elif args.step == 'read':
+            from src.artifacts import ArtifactWriter
+            from src.data_acquisition import iter_load_data
+            chunks = iter_load_data(args.input, **config["load_data"])
+            if args.output is not None:
+                # stream chunks straight to disk so memory stays bounded by the chunk size
+                writer = ArtifactWriter(args.output, fmt, schema)
+                for chunk in chunks:
+                    writer.write(chunk)
+                writer.close()
+                record['rows'] = writer.n_rows
+                logger.info(f'Output saved to {args.output}.')
+
+        # feature generation
+        elif args.step == 'featurize':
+            from src.artifacts import read_artifact
+            from src.pipeline import featurize, featurize_stream
+            stream_config = config.get("stream_features", {})
+            if stream_config.get("chunksize") and args.output is not None:
+                # read, featurize and write in chunks so memory does not grow with the input
+                record['rows'] = featurize_stream(args.input, args.output, config["generate_features"],
+                                                  config["train_model"]["fit_model"]["features_list"], fmt=fmt,
+                                                  schema=schema, **stream_config)
+                logger.info(f'Output saved to {args.output}.')
+            else:
+                data = read_artifact(args.input, fmt, schema)
+                output = featurize(data, config["generate_features"],
+                                   config["train_model"]["fit_model"]["features_list"], fmt=fmt, schema=schema)
+
+        # model training
+        elif args.step == 'train':
+            from src.artifacts import open_matrix, read_artifact, resolve_format
+            from src.pipeline import train, train_config, train_matrix
+            model_config = train_config(config)
+            if resolve_format(args.input, fmt) == 'matrix':
+                # train on the memory-mapped matrix, whose pages concurrent processes share instead of copying
+                X, y, _ = open_matrix(args.input, model_config["fit_model"]["features_list"])
+                output = train_matrix(X, y, model_config)
+                record['rows'] = len(X)
+            else:
+                data = read_artifact(args.input, fmt, schema)
+                output = train(data, model_config)
+
+        # add trees fitted on rows appended to the featurized archive since the model was last trained
+        elif args.step == 'update':
+            from src.artifacts import read_artifact
+            from src.feature_generation import feature_gen
+            from src.train_model import load_model, save_model, update_model
+            model_path = config["train_model"]["save_model"]["path"]
+            bundle = load_model(model_path)
+            data = read_artifact(args.input, fmt, schema)
+            features, labels = feature_gen(data)
+            updated = update_model(bundle, features, labels, **config["update_model"])
+            if updated is not bundle:
+                save_model(updated['model'], updated['features_list'], model_path,
+                           rows_seen=updated['rows_seen'], tree_batches=updated['tree_batches'])
+
+        # cross-validated hyperparameter search
+        elif args.step == 'tune':
+            from src.artifacts import read_artifact
+            from src.feature_generation import feature_gen
+            from src.tune_model import tune, best_params, save_params
+            data = read_artifact(args.input, fmt, schema)
+            tune_config = config["tune_model"]
+            features, labels = feature_gen(data)
+            # folds keep the rows of a group together, as the train/test split does
+            group_column = config["train_model"].get("group_column")
+            groups = data[group_column].to_numpy() if group_column is not None else None
+            output = tune(features, labels, config["train_model"]["fit_model"]["features_list"],
+                          tune_config["param_grid"], config["train_model"]["model_params"], **tune_config["cv"],
+                          groups=groups)
+            save_params(best_params(output, tune_config["param_grid"]), tune_config["best_params_path"])
+
+        # score new data with the saved model
+        elif args.step == 'predict':
+            from src.artifacts import open_matrix, read_artifact, resolve_format
+            from src.predict_model import predict
+            from src.train_model import load_model
+            bundle = load_model(config["train_model"]["save_model"]["path"])
+            if resolve_format(args.input, fmt) == 'matrix':
+                # score batches straight from the memory-mapped matrix
+                X, _, _ = open_matrix(args.input, bundle['features_list'])
+                output = predict(bundle, X, **config["predict"])
+                record['rows'] = len(X)
+            else:
+                data = read_artifact(args.input, fmt, schema)
+                output = predict(bundle, data, **config["predict"])
+
+        # long-running scoring service with micro-batching
+        elif args.step == 'serve':
+            from src.serve_model import serve
+            from src.train_model import load_model
+            # score with the same decision threshold as the predict step
+            serve(load_model(config["train_model"]["save_model"]["path"]), threshold=config["predict"]["threshold"],
+                  **config["serve_model"])
+
+        # model evaluation
+        elif args.step == 'evaluate':
+            from src.pipeline import evaluate_file
+            # predictions are read in chunks and metrics accumulated, so the file never has to fit in memory
+            metrics = evaluate_file(args.input, config.get("evaluate_model"), fmt, schema)
+            record['rows'] = metrics['rows']
+
+        # read, featurize, train and evaluate in one process without intermediate csv files
+        elif args.step == 'all':
+            from src.pipeline import run_pipeline
+            output = run_pipeline(args.input, config, save_intermediate=args.save_intermediate, cache=cache,
+                                  schema=schema)
+
+        # run every config variant, sharing common steps, and compare their metrics
+        elif args.step == 'experiment':
+            from src.experiments import run_experiments
+            with open(args.experiments, "r") as f:
+                experiment_config = yaml.safe_load(f)
+            output = run_experiments(args.input, config, experiment_config["experiments"],
+                                     experiment_config.get("n_jobs", -1))
+            print(output.to_string(index=False))
+
+        if args.output is not None and output is not None:
+            import pandas as pd
+            from src.artifacts import write_artifact
+            if type(output) == str and output != '':
+                with open(args.output, 'w') as text:
+                    text.write(output)
+                    logger.info(f'Output saved to {args.output}.')
+            elif type(output) == pd.DataFrame:
+                write_artifact(output, args.output, fmt, schema)
+                logger.info(f'Output saved to {args.output}.')
+            else:
+                logger.error(f'Error: Output in questionable format.')
+        if data is not None:
+            record['rows'] = len(data)
+
+    if profiler.enabled and profiler.metrics_path is not None:
+        logger.info(f'Profile metrics appended to {profiler.metrics_path}.')
+
+    if key is not None and not hit:
+        cache.put_files(key, cached_paths)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.profiling import record_io
+from src.schema import LABEL, apply_schema
+
+FORMATS = {'.csv': 'csv', '.feather': 'feather', '.parquet': 'parquet', '.npy': 'npy', '.mmap': 'matrix'}
+
+
+def resolve_format(path: str, fmt: str = 'auto') -> str:
+    """Work out the storage format of an artifact.
+
+    :param path: str - artifact path
+    :param fmt: str - one of 'auto', 'csv', 'feather', 'parquet', 'npy' or 'matrix'; 'auto' picks the format from
+                      the file extension and falls back to csv
+    :return: str - storage format
+    """
+    if fmt is None or fmt == 'auto':
+        return FORMATS.get(os.path.splitext(str(path))[1].lower(), 'csv')
+    if fmt not in FORMATS.values():
+        raise ValueError(f"Unknown artifact format '{fmt}'. Choose one of {sorted(FORMATS.values())} or 'auto'.")
+    return fmt
+
+
+def write_artifact(data: pd.DataFrame, path: str, fmt: str = 'auto', schema: dict = None) -> None:
+    """Write a dataframe (or series) to disk in the requested format.
+
+    The 'npy' format is a directory holding one .npy file per column and a 'columns.json' index, so that
+    each column can be memory-mapped on read. The 'matrix' format is a directory holding every column but the
+    label as one C-contiguous 2-D 'features.npy', the label as 'labels.npy' and a 'meta.json' header, so that
+    processes can share the whole feature matrix memory-mapped, see `open_matrix`.
+
+    :param data: :obj: pandas dataframe or series - data to write
+    :param path: str - output path
+    :param fmt: str - artifact format, see `resolve_format`
+    :param schema: dict - if given, column order and dtypes to write, see `src.schema.build_schema`
+    :return: None
+    """
+    writer = ArtifactWriter(path, fmt, schema)
+    writer.write(data)
+    writer.close()
+
+
+def read_artifact(path: str, fmt: str = 'auto', schema: dict = None) -> pd.DataFrame:
+    """Read a dataframe written by `write_artifact`.
+
+    :param path: str - artifact path
+    :param fmt: str - artifact format, see `resolve_format`
+    :param schema: dict - if given, column order and dtypes to read the data in, see `src.schema.build_schema`
+    :return: :obj: pandas dataframe - artifact contents
+    """
+    fmt = resolve_format(path, fmt)
+    record_io('read', path)
+    if fmt == 'csv':
+        # parse straight into the schema dtypes instead of inferring float64/int64 and casting afterwards
+        data = pd.read_csv(path, dtype=schema)
+    elif fmt == 'feather':
+        data = pd.read_feather(path)
+    elif fmt == 'parquet':
+        data = pd.read_parquet(path)
+    elif fmt == 'matrix':
+        X, y, meta = open_matrix(path)
+        data = _matrix_frame(X, y, meta, 0, meta['rows'])
+    else:
+        with open(os.path.join(path, 'columns.json'), 'r') as f:
+            columns = json.load(f)['columns']
+        data = pd.DataFrame({column: np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r')
+                             for i, column in enumerate(columns)}, columns=columns)
+
+    return apply_schema(data, schema) if schema is not None else data
+
+
+def open_matrix(path: str, columns: list = None) -> tuple:
+    """Memory-map the feature matrix and labels of a 'matrix' artifact without copying them.
+
+    The arrays are read-only views of the files, so every process that opens the artifact shares one copy of
+    it in the page cache.
+
+    :param path: str - artifact path
+    :param columns: list - if given, the matrix columns to return, in order; any other selection or order than
+                           the stored one is copied out of the memory map
+    :return: tuple - n_rows x n_columns feature matrix, label vector (None if the artifact has no label) and
+                     the 'meta.json' header: matrix 'columns' and 'dtype', 'label' and 'label_dtype', 'rows' and
+                     the 'dtypes' of the columns written, in their original order
+    """
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    record_io('read', path)
+    X = np.load(os.path.join(path, 'features.npy'), mmap_mode='r')
+    y = np.load(os.path.join(path, 'labels.npy'), mmap_mode='r') if meta['label'] is not None else None
+    if columns is not None and list(columns) != meta['columns']:
+        missing = [column for column in columns if column not in meta['columns']]
+        if missing:
+            raise KeyError(f"Columns {missing} are not in the matrix at {path}.")
+        X = np.ascontiguousarray(X[:, [meta['columns'].index(column) for column in columns]])
+    return X, y, meta
+
+
+def iter_artifact(path: str, fmt: str = 'auto', chunksize: int = 100000, schema: dict = None):
+    """Read an artifact written by `write_artifact` in chunks of rows.
+
+    csv and parquet are parsed chunk by chunk; feather, npy and matrix artifacts are memory-mapped and sliced, so
+    only the rows of the current chunk are loaded.
+
+    :param path: str - artifact path
+    :param fmt: str - artifact format, see `resolve_format`
+    :param chunksize: int - maximum number of rows per chunk
+    :param schema: dict - if given, column order and dtypes to read the data in, see `src.schema.build_schema`
+    :return: generator - yields :obj: pandas dataframes
+    """
+    for chunk in _iter_chunks(path, resolve_format(path, fmt), chunksize, schema):
+        yield apply_schema(chunk, schema) if schema is not None else chunk
+
+
+def _iter_chunks(path, fmt, chunksize, schema):
+    record_io('read', path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=schema)
+        return
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    elif fmt == 'feather':
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield table.slice(start, chunksize).to_pandas()
+        return
+    elif fmt == 'matrix':
+        X, y, meta = open_matrix(path)
+        for start in range(0, meta['rows'], chunksize):
+            yield _matrix_frame(X, y, meta, start, min(start + chunksize, meta['rows']))
+        return
+
+    with open(os.path.join(path, 'columns.json'), 'r') as f:
+        columns = json.load(f)['columns']
+    arrays = [np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r') for i in range(len(columns))]
+    for start in range(0, len(arrays[0]) if arrays else 0, chunksize):
+        yield pd.DataFrame({column: np.array(array[start:start + chunksize]) for column, array in zip(columns, arrays)},
+                           columns=columns, index=pd.RangeIndex(start, min(start + chunksize, len(arrays[0]))))
+
+
+def _matrix_frame(X, y, meta, start, stop):
+    # a 2-D block over the memory map, so the feature columns are not copied
+    data = pd.DataFrame(X[start:stop], columns=meta['columns'], index=pd.RangeIndex(start, stop), copy=False)
+    dtypes = {column: dtype for column, dtype in meta['dtypes'].items()
+              if column in meta['columns'] and np.dtype(dtype) != X.dtype}
+    if dtypes:
+        data = data.astype(dtypes)
+    if y is not None:
+        data.insert(list(meta['dtypes']).index(meta['label']), meta['label'], y[start:stop])
+    return data
+
+
+def _write_npy(part, path, dtype, shape):
+    # prepend the .npy header now that the final row count is known
+    with open(path, 'wb') as out, open(part, 'rb') as raw:
+        np.lib.format.write_array_header_1_0(
+            out, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': shape})
+        shutil.copyfileobj(raw, out)
+    os.remove(part)
+
+
+class ArtifactWriter:
+    """Append dataframe chunks to a single artifact.
+
+    csv, npy, matrix and parquet artifacts are written chunk by chunk; feather has no append mode, so chunks are
+    held in memory and written on `close`.
+    """
+
+    def __init__(self, path: str, fmt: str = 'auto', schema: dict = None):
+        """
+        :param path: str - output path
+        :param fmt: str - artifact format, see `resolve_format`
+        :param schema: dict - if given, column order and dtypes every chunk is written in, see
+                              `src.schema.build_schema`
+        """
+        self.path = path
+        self.fmt = resolve_format(path, fmt)
+        self.schema = schema
+        self.columns = None
+        self.n_rows = 0
+        self._chunks = []
+        self._parts = []
+        self._dtypes = []
+        self._parquet = None
+        self._label = None
+        self._matrix_columns = []
+        self._matrix_dtype = None
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        """Append a chunk of rows.
+
+        :param chunk: :obj: pandas dataframe or series - rows to append
+        :return: None
+        """
+        if self.schema is not None:
+            chunk = apply_schema(chunk, self.schema)
+        if isinstance(chunk, pd.Series):
+            chunk = chunk.to_frame()
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self._open()
+        elif list(chunk.columns) != self.columns:
+            raise ValueError(f"Chunk columns {list(chunk.columns)} do not match {self.columns}.")
+
+        if self.fmt == 'csv':
+            chunk.to_csv(self.path, mode='w' if self.n_rows == 0 else 'a', header=self.n_rows == 0, index=False)
+        elif self.fmt == 'feather':
+            self._chunks.append(chunk)
+        elif self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        elif self.fmt == 'matrix':
+            if self.n_rows == 0:
+                self._dtypes = [chunk[column].dtype for column in self.columns]
+                self._matrix_dtype = np.result_type(*[chunk[column].dtype for column in self._matrix_columns])
+            # rows are appended whole, so the file is the C-contiguous matrix
+            rows = chunk[self._matrix_columns].to_numpy(self._matrix_dtype)
+            self._parts[0].write(np.ascontiguousarray(rows).tobytes())
+            if self._label is not None:
+                label_dtype = self._dtypes[self.columns.index(self._label)]
+                self._parts[1].write(np.ascontiguousarray(chunk[self._label].values, dtype=label_dtype).tobytes())
+        else:
+            for i, column in enumerate(self.columns):
+                if self.n_rows == 0:
+                    self._dtypes.append(chunk[column].dtype)
+                self._parts[i].write(np.ascontiguousarray(chunk[column].values, dtype=self._dtypes[i]).tobytes())
+        self.n_rows += len(chunk)
+
+    def close(self) -> None:
+        """Finish writing the artifact.
+
+        :return: None
+        """
+        if self.columns is None:
+            raise ValueError(f"No data was written to {self.path}.")
+        if self.fmt == 'feather':
+            pd.concat(self._chunks, ignore_index=True).to_feather(self.path)
+            self._chunks = []
+        elif self.fmt == 'parquet':
+            self._parquet.close()
+        elif self.fmt == 'npy':
+            for i, part in enumerate(self._parts):
+                part.close()
+                _write_npy(part.name, os.path.join(self.path, f'{i}.npy'), self._dtypes[i], (self.n_rows,))
+            with open(os.path.join(self.path, 'columns.json'), 'w') as f:
+                json.dump({'columns': self.columns}, f)
+        elif self.fmt == 'matrix':
+            for part in self._parts:
+                part.close()
+            _write_npy(self._parts[0].name, os.path.join(self.path, 'features.npy'), self._matrix_dtype,
+                       (self.n_rows, len(self._matrix_columns)))
+            if self._label is not None:
+                _write_npy(self._parts[1].name, os.path.join(self.path, 'labels.npy'),
+                           self._dtypes[self.columns.index(self._label)], (self.n_rows,))
+            dtypes = {column: str(dtype) for column, dtype in zip(self.columns, self._dtypes)}
+            meta = {'columns': self._matrix_columns, 'dtype': str(self._matrix_dtype), 'label': self._label,
+                    'label_dtype': dtypes.get(self._label), 'rows': self.n_rows, 'dtypes': dtypes}
+            with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+        record_io('written', self.path)
+
+    def _open(self):
+        if self.fmt in ['npy', 'matrix']:
+            if os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+            os.makedirs(self.path)
+        if self.fmt == 'npy':
+            self._parts = [open(os.path.join(self.path, f'{i}.part'), 'wb') for i in range(len(self.columns))]
+        elif self.fmt == 'matrix':
+            self._label = LABEL if LABEL in self.columns else None
+            self._matrix_columns = [column for column in self.columns if column != self._label]
+            if not self._matrix_columns:
+                raise ValueError(f"A matrix artifact needs columns besides the label, got {self.columns}.")
+            self._parts = [open(os.path.join(self.path, name), 'wb')
+                           for name in ['features.part', 'labels.part'][:2 if self._label else 1]]
@@ -0,0 +1,249 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash the contents of a file, or of every file in a directory artifact.
+
+    :param path: str - file or directory to hash
+    :param chunk_size: int - number of bytes read at a time
+    :return: str - sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    for file in files:
+        digest.update(os.path.relpath(file, path).encode())
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def path_size(path: str) -> int:
+    """Get the size of a file, or the total size of the files in a directory artifact.
+
+    :param path: str - file or directory
+    :return: int - size in bytes
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def code_version(*modules) -> str:
+    """Hash the source code a step runs.
+
+    :param modules: modules or functions whose source determines the step's output
+    :return: str - sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()
+
+
+def step_key(step: str, input_hash: str, config: dict, code_hash: str) -> str:
+    """Build the cache key of a pipeline step.
+
+    :param step: str - step name
+    :param input_hash: str - hash of the step's input data (or the key of the step producing it)
+    :param config: dict - the config subsections the step uses
+    :param code_hash: str - hash of the step's code, see `code_version`
+    :return: str - sha256 hex digest
+    """
+    payload = json.dumps({'step': step, 'input': input_hash, 'config': config, 'code': code_hash},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StepCache:
+    """Local content-addressed store of step outputs with size-based LRU eviction.
+
+    Entries are either pickled python objects (`get`/`put`) or copies of output files and directories
+    (`get_file`/`put_file`, or `get_files`/`put_files` for all the files a step writes). Reading an entry marks it
+    as recently used.
+    """
+
+    def __init__(self, dir: str = '.cache', max_size_mb: float = 1024, enabled: bool = True):
+        """
+        :param dir: str - cache directory
+        :param max_size_mb: float - total size the cache is trimmed to after each write, in megabytes
+        :param enabled: bool - if False, every lookup misses and nothing is stored
+        """
+        self.dir = dir
+        self.max_size = max_size_mb * 1024 * 1024
+        self.enabled = enabled
+        if enabled:
+            os.makedirs(dir, exist_ok=True)
+
+    def get(self, key: str):
+        """Look up a cached python object.
+
+        :param key: str - cache key, see `step_key`
+        :return: cached object, or None on a miss
+        """
+        if not self.enabled or not os.path.exists(self._path(key, '.pkl')):
+            return None
+        path = self._path(key, '.pkl')
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            self._touch(path)
+        except FileNotFoundError:
+            # evicted by another process sharing the cache
+            return None
+        logger.info(f'Cache hit for {key[:12]}.')
+        return value
+
+    def put(self, key: str, value) -> None:
+        """Store a python object.
+
+        :param key: str - cache key, see `step_key`
+        :param value: object to store; must be picklable
+        :return: None
+        """
+        if not self.enabled:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key, '.pkl'))
+        self.evict()
+
+    def get_or_compute(self, key: str, compute, paths: dict = None):
+        """Look up a cached python object, computing and storing it on a miss.
+
+        :param key: str - cache key, see `step_key`
+        :param compute: callable - takes no arguments and returns the value to cache
+        :param paths: dict - name -> path of files `compute` writes besides its value (e.g. a saved model); they are
+                             cached with the value and restored with it, see `get_files`
+        :return: cached or freshly computed object
+        """
+        paths = paths or {}
+        value = self.get(key)
+        if value is None or not self.get_files(key, paths):
+            value = compute()
+            self.put(key, value)
+            self.put_files(key, paths)
+        return value
+
+    def get_file(self, key: str, dest: str) -> bool:
+        """Copy a cached output file or directory to `dest`.
+
+        :param key: str - cache key, see `step_key`
+        :param dest: str - path to restore the output to
+        :return: bool - True on a hit, False on a miss
+        """
+        if not self.enabled or not os.path.exists(self._path(key, '.out')):
+            return False
+        path = self._path(key, '.out')
+        self._remove(dest)
+        if os.path.isdir(path):
+            shutil.copytree(path, dest)
+        else:
+            shutil.copyfile(path, dest)
+        self._touch(path)
+        logger.info(f'Cache hit for {key[:12]}, restored {dest}.')
+        return True
+
+    def put_file(self, key: str, src: str) -> None:
+        """Store a copy of an output file or directory.
+
+        :param key: str - cache key, see `step_key`
+        :param src: str - path of the output to store
+        :return: None
+        """
+        if not self.enabled:
+            return
+        tmp = tempfile.mkdtemp(dir=self.dir, suffix='.tmp')
+        staged = os.path.join(tmp, 'out')
+        if os.path.isdir(src):
+            shutil.copytree(src, staged)
+        else:
+            shutil.copyfile(src, staged)
+        path = self._path(key, '.out')
+        self._remove(path)
+        os.replace(staged, path)
+        os.rmdir(tmp)
+        self.evict()
+
+    def get_files(self, key: str, paths: dict) -> bool:
+        """Restore several output files or directories of one step, either all of them or none.
+
+        :param key: str - cache key, see `step_key`
+        :param paths: dict - name -> path to restore the step's output of that name to
+        :return: bool - True on a hit, False if any of the outputs is missing from the cache
+        """
+        if not self.enabled:
+            return False
+        # check first, so that a partly evicted entry leaves the files on disk untouched
+        if not all(os.path.exists(self._path(self._file_key(key, name), '.out')) for name in paths):
+            return False
+        return all([self.get_file(self._file_key(key, name), path) for name, path in paths.items()])
+
+    def put_files(self, key: str, paths: dict) -> None:
+        """Store copies of several output files or directories of one step.
+
+        :param key: str - cache key, see `step_key`
+        :param paths: dict - name -> path of the step's output of that name
+        :return: None
+        """
+        for name, path in paths.items():
+            self.put_file(self._file_key(key, name), path)
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in its size limit.
+
+        :return: None
+        """
+        entries = []
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            if name.endswith('.tmp'):
+                continue
+            try:
+                entries.append((os.path.getmtime(path), path_size(path), path))
+            except FileNotFoundError:
+                # evicted by another process sharing the cache
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+            logger.info(f'Evicted {os.path.basename(path)} from the cache.')
+
+    @staticmethod
+    def _file_key(key, name):
+        return hashlib.sha256(f'{key}/{name}'.encode()).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.dir, key + suffix)
+
+    @staticmethod
+    def _touch(path):
+        os.utime(path, None)
+
+    @staticmethod
+    def _remove(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
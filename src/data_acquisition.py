@@ -1,65 +1,234 @@
-import time
-import requests
-
-import pandas as pd
-import numpy as np
-
-import logging
-
-logger0 = logging.getLogger(__name__)
-
-
-def save_data(html: str, attempt: int, wait: int) -> str:
-    """Make html request to download cloud data.
-
-    :param html: str - url to make html requests
-    :param attempt: int - number of request attempts if connection error arises
-    :param wait: int - number of seconds to wait before the next request attempt
-    :return: str - downloaded text file
-    """
-    for i in range(attempt):
-        try:
-            response = requests.get(html).text
-        except requests.exceptions.ConnectionError:
-            if i + 1 < attempt:
-                logger0.warning(f"There was a connection error during attempt {i} of {attempt}. "
-                                f"Waiting {wait} seconds then trying again.")
-                time.sleep(wait)
-            else:
-                logger0.error("Max attempt reached. There was a connection error when attempting to call %s.", html)
-                response = ''
-        except requests.exceptions.HTTPError:
-            logger0.error("Invalid HTTP response. Check your url.")
-            response = ''
-            break
-        else:
-            break
-
-    return response
-
-
-def load_data(data: list, columns: list) -> pd.DataFrame:
-    """Load cloud data from local path and write a concatenated csv.
-
-    :param data: list - list of lists of lines of text in raw data text
-    :param columns: list - columns to load
-    :return: :obj: pandas dataframe - data as csv
-    """
-    # extract data for first cloud
-    first_cloud = data[53:1077]
-    first_cloud = [[float(s.replace('/n', '')) for s in cloud]
-                   for cloud in first_cloud]
-    first_cloud = pd.DataFrame(first_cloud, columns=columns)
-    first_cloud['class'] = np.zeros(len(first_cloud))
-
-    # extract data for second cloud
-    second_cloud = data[1082:2105]
-    second_cloud = [[float(s.replace('/n', '')) for s in cloud]
-                    for cloud in second_cloud]
-    second_cloud = pd.DataFrame(second_cloud, columns=columns)
-    second_cloud['class'] = np.ones(len(second_cloud))
-
-    # concatenate dataframes for training
-    data = pd.concat([first_cloud, second_cloud])
-
-    return data
+import csv
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.profiling import profiled, record_io
+
+import logging
+
+logger0 = logging.getLogger(__name__)
+
+
+# statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def make_session(pool_size: int = 4) -> requests.Session:
+    """Create an HTTP session that keeps up to `pool_size` connections per host open for reuse.
+
+    :param pool_size: int - number of pooled connections, at least the number of concurrent downloads
+    :return: :obj: requests.Session - pooled session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def download_file(session: requests.Session, url: str, path: str, attempt: int = 4, backoff: float = 1,
+                  max_backoff: float = 60, chunk_size: int = 2 ** 20, timeout: float = 30) -> bool:
+    """Stream one url to disk, skipping it if unchanged and resuming an interrupted download.
+
+    The body is written to `path + '.part'` and moved into place once complete. The response's ETag and
+    Last-Modified headers are kept in `path + '.meta.json'`; they make the next download conditional (a 304
+    response leaves the file as it is) and let a leftover .part file be resumed with a Range request.
+
+    :param session: :obj: requests.Session - session to download with, see `make_session`
+    :param url: str - url to download
+    :param path: str - output path
+    :param attempt: int - number of request attempts on connection errors, timeouts and 429/5xx responses
+    :param backoff: float - seconds to wait before the second attempt; doubled (with jitter) after each failure
+    :param max_backoff: float - longest wait between attempts
+    :param chunk_size: int - bytes read from the response and written at a time
+    :param timeout: float - seconds to wait for the server to connect or send data
+    :return: bool - True if the file was downloaded, False if it was unchanged
+    """
+    part_path, meta_path = path + '.part', path + '.meta.json'
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+    if meta.get('url') != url:
+        meta = {}
+
+    for i in range(attempt):
+        headers = {}
+        validator = meta.get('etag') or meta.get('last_modified')
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and validator:
+            # If-Range makes the server send the whole file instead of a range if it changed in between
+            headers.update({'Range': f'bytes={offset}-', 'If-Range': validator})
+        elif os.path.exists(path) and meta.get('complete'):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    logger0.info(f'{url} is unchanged, keeping {path}.')
+                    return False
+                if response.status_code == 416:
+                    # the .part file does not match the remote file; start over
+                    os.remove(part_path)
+                    continue
+                if response.status_code in RETRY_STATUSES:
+                    raise requests.exceptions.RetryError(f'{response.status_code} response from {url}.')
+                response.raise_for_status()
+
+                resume = response.status_code == 206
+                if not resume:
+                    meta = {'url': url, 'etag': response.headers.get('ETag'),
+                            'last_modified': response.headers.get('Last-Modified'), 'complete': False}
+                    _write_meta(meta_path, meta)
+                with open(part_path, 'ab' if resume else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError, requests.exceptions.RetryError) as e:
+            if i + 1 == attempt:
+                logger0.error(f'Max attempt reached downloading {url}: {e}')
+                raise
+            wait = random.uniform(0.5, 1) * min(backoff * 2 ** i, max_backoff)
+            logger0.warning(f'Attempt {i + 1} of {attempt} to download {url} failed ({e}). '
+                            f'Waiting {wait:.1f} seconds then trying again.')
+            time.sleep(wait)
+            continue
+
+        os.replace(part_path, path)
+        _write_meta(meta_path, dict(meta, complete=True))
+        record_io('written', path)
+        logger0.info(f'Downloaded {url} to {path}' + (f' (resumed at byte {offset}).' if resume else '.'))
+        return True
+
+    raise requests.exceptions.RetryError(f'Could not download {url} in {attempt} attempts.')
+
+
+def download_files(urls: list, output_dir: str, max_workers: int = 4, **kwargs) -> dict:
+    """Download several urls concurrently over a shared pool of connections.
+
+    Each file is saved in `output_dir` under the last component of its url path, see `download_file`.
+
+    :param urls: list - urls to download
+    :param output_dir: str - directory to save the files in
+    :param max_workers: int - number of concurrent downloads
+    :param kwargs: dict - retry, chunk size and timeout settings, see `download_file`
+    :return: dict - url -> True if downloaded, False if unchanged
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {url: os.path.join(output_dir, os.path.basename(urlparse(url).path)) for url in urls}
+    if len(set(paths.values())) < len(paths):
+        raise ValueError(f'Urls {urls} do not have distinct file names.')
+
+    with make_session(max_workers) as session, ThreadPoolExecutor(max_workers) as executor:
+        futures = {url: executor.submit(download_file, session, url, path, **kwargs) for url, path in paths.items()}
+        results, failed = {}, []
+        for url, future in futures.items():
+            try:
+                results[url] = future.result()
+            except requests.exceptions.RequestException as e:
+                logger0.error(f'Failed to download {url}: {e}')
+                failed.append(url)
+    if failed:
+        raise RuntimeError(f'Failed to download {failed}; rerun to resume.')
+
+    return results
+
+
+def _write_meta(path, meta):
+    with open(path, 'w') as f:
+        json.dump(meta, f)
+
+
+def detect_blocks(path: str, n_columns: int, min_block_rows: int = 10) -> list:
+    """Scan the raw text file for runs of numeric rows, one run per cloud.
+
+    :param path: str - path to raw cloud data text file
+    :param n_columns: int - number of numeric fields expected on each data row
+    :param min_block_rows: int - shortest run of numeric rows accepted as a cloud block
+    :return: list - list of [start, stop) line ranges, one per cloud block
+    """
+    number = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+    row = re.compile(r'^\s*(?:%s\s+){%d}%s\s*$' % (number, n_columns - 1, number))
+
+    blocks = []
+    start = None
+    i = 0
+    with open(path, 'r') as f:
+        for i, line in enumerate(f):
+            if row.match(line):
+                if start is None:
+                    start = i
+            else:
+                if start is not None and i - start >= min_block_rows:
+                    blocks.append([start, i])
+                start = None
+        # the last block may run to the end of the file
+        if start is not None and i + 1 - start >= min_block_rows:
+            blocks.append([start, i + 1])
+
+    return blocks
+
+
+def iter_load_data(path: str, columns: list, blocks: list = None, chunksize: int = 100000,
+                   min_block_rows: int = 10):
+    """Stream cloud data from the raw text file in bounded-size chunks.
+
+    :param path: str - path to raw cloud data text file
+    :param columns: list - columns to load
+    :param blocks: list - optional list of [start, stop) line ranges, one per cloud; detected if not given
+    :param chunksize: int - maximum number of rows held in memory per chunk
+    :param min_block_rows: int - shortest run of numeric rows accepted as a cloud block when detecting
+    :return: generator - yields :obj: pandas dataframes of float32 columns with an int8 'class' column set to
+                         the block index, see `src.schema.build_schema`
+    """
+    # pandas is imported here so that `acquire` does not pay for it
+    import numpy as np
+    import pandas as pd
+    from src.schema import LABEL, build_schema
+
+    if blocks is None:
+        blocks = detect_blocks(path, len(columns), min_block_rows)
+        logger0.info("Detected cloud blocks at lines %s.", blocks)
+    if len(blocks) == 0:
+        raise ValueError(f"No cloud data blocks found in {path}.")
+    record_io('read', path)
+    schema = build_schema(columns)
+
+    for label, (start, stop) in enumerate(blocks):
+        reader = pd.read_csv(path, sep=r'\s+', header=None, names=columns, dtype=schema,
+                             skiprows=start, nrows=stop - start, chunksize=chunksize,
+                             quoting=csv.QUOTE_NONE)
+        for chunk in reader:
+            chunk[LABEL] = np.full(len(chunk), label, dtype=schema[LABEL])
+            yield chunk
+
+
+@profiled
+def load_data(path: str, columns: list, blocks: list = None, chunksize: int = 100000,
+              min_block_rows: int = 10) -> 'pd.DataFrame':
+    """Load cloud data from local path into a single dataframe.
+
+    :param path: str - path to raw cloud data text file
+    :param columns: list - columns to load
+    :param blocks: list - optional list of [start, stop) line ranges, one per cloud; detected if not given
+    :param chunksize: int - maximum number of rows parsed at once
+    :param min_block_rows: int - shortest run of numeric rows accepted as a cloud block when detecting
+    :return: :obj: pandas dataframe - data as csv
+    """
+    import pandas as pd
+
+    chunks = iter_load_data(path, columns, blocks, chunksize, min_block_rows)
+    data = pd.concat(chunks, ignore_index=True)
+
+    return data
@@ -1,28 +1,155 @@
-from sklearn.metrics import roc_auc_score, confusion_matrix, accuracy_score
-import pandas as pd
-
-import logging
-
-
-def evaluation(y_test: pd.DataFrame, pred_df: pd.DataFrame) -> None:
-    """evaluate model performance on test set.
-
-    :param y_test: :obj: pandas dataframe of actual y's
-    :param pred_df: pandas dataframe of predicted y's
-    :return: None
-    """
-    ypred_proba_test = pred_df['ypred_proba'].values
-    ypred_bin_test = pred_df['ypred_bin'].values
-
-    auc = roc_auc_score(y_test, ypred_proba_test)
-    confusion = confusion_matrix(y_test, ypred_bin_test)
-    accuracy = accuracy_score(y_test, ypred_bin_test)
-
-    confusion_df = pd.DataFrame(confusion,
-                                index=['Actual negative', 'Actual positive'],
-                                columns=['Predicted negative', 'Predicted positive'])
-
-    print('AUC on test: %0.3f' % auc)
-    print('Accuracy on test: %0.3f' % accuracy)
-    print()
-    print(confusion_df)
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.profiling import profiled
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingEvaluator:
+    """Accumulate binary classification metrics over chunks of predictions.
+
+    The AUC is computed from per-class histograms of the predicted probability, so memory is fixed by `n_bins`
+    however many rows are seen; a positive and a negative row in the same bin count as a tie. The confusion
+    counts at every threshold of the grid are exact and updated in one vectorized pass per chunk.
+    """
+
+    def __init__(self, thresholds=101, n_bins: int = 100000):
+        """
+        :param thresholds: int or list - number of evenly spaced thresholds from 0 to 1, or the thresholds
+        :param n_bins: int - number of probability bins of the AUC histograms
+        """
+        self.thresholds = np.linspace(0, 1, thresholds) if np.isscalar(thresholds) else \
+            np.sort(np.asarray(thresholds, dtype=np.float64))
+        self.n_bins = n_bins
+        # row: actual class
+        self.histograms = np.zeros((2, n_bins), dtype=np.int64)
+        self.above = np.zeros((2, len(self.thresholds)), dtype=np.int64)
+        # row: actual class, column: predicted class, for the classes predicted by the model
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+
+    def update(self, y, proba, pred=None) -> None:
+        """Add a chunk of predictions.
+
+        :param y: :obj: numpy array or pandas series - actual classes, 0 or 1
+        :param proba: :obj: numpy array or pandas series - predicted probability of class 1
+        :param pred: :obj: numpy array or pandas series - predicted classes, if any
+        :return: None
+        """
+        y = np.asarray(y)
+        if ((y != 0) & (y != 1)).any():
+            raise ValueError(f"Actual classes must be 0 or 1, got {np.unique(y)}.")
+        y = y.astype(np.intp)
+        proba = np.asarray(proba, dtype=np.float64)
+        bins = np.clip((proba * self.n_bins).astype(np.intp), 0, self.n_bins - 1)
+        # a row is predicted positive at exactly the thresholds below its probability
+        n_below = np.searchsorted(self.thresholds, proba, side='left')
+        for label in [0, 1]:
+            rows = y == label
+            self.histograms[label] += np.bincount(bins[rows], minlength=self.n_bins)
+            counts = np.bincount(n_below[rows], minlength=len(self.thresholds) + 1)
+            self.above[label] += np.cumsum(counts[::-1])[::-1][1:]
+        if pred is not None:
+            self.confusion += np.bincount(2 * y + np.asarray(pred).astype(np.intp), minlength=4).reshape(2, 2)
+
+    def metrics(self) -> dict:
+        """Summarize the predictions seen so far.
+
+        :return: dict - row count, AUC, accuracy and confusion matrix of the predicted classes, and the
+                        confusion counts, precision, recall, false positive rate, accuracy and F1 at each threshold
+        """
+        negatives, positives = self.histograms.sum(axis=1)
+        n_rows = int(negatives + positives)
+        auc = None
+        if negatives and positives:
+            negatives_below = np.cumsum(self.histograms[0]) - self.histograms[0]
+            auc = float(np.sum(self.histograms[1] * (negatives_below + 0.5 * self.histograms[0])) /
+                        (positives * negatives))
+
+        tp, fp = self.above[1], self.above[0]
+        fn, tn = positives - tp, negatives - fp
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table = pd.DataFrame({'threshold': self.thresholds, 'tp': tp, 'fp': fp, 'tn': tn, 'fn': fn,
+                                  'precision': tp / (tp + fp), 'recall': tp / positives, 'fpr': fp / negatives,
+                                  'accuracy': (tp + tn) / n_rows, 'f1': 2 * tp / (2 * tp + fp + fn)})
+        # undefined ratios (e.g. precision with nothing predicted positive) become nulls
+        table = table.astype(object).where(table.notna(), None)
+
+        n_predicted = int(self.confusion.sum())
+        return {'rows': n_rows,
+                'auc': auc,
+                'accuracy': float(np.trace(self.confusion) / n_predicted) if n_predicted else None,
+                'confusion_matrix': self.confusion.tolist(),
+                'thresholds': table.to_dict('records')}
+
+
+def print_metrics(metrics: dict) -> None:
+    """Print the AUC, accuracy and confusion matrix of a `StreamingEvaluator.metrics` summary.
+
+    :param metrics: dict - metrics summary
+    :return: None
+    """
+    confusion_df = pd.DataFrame(metrics['confusion_matrix'],
+                                index=['Actual negative', 'Actual positive'],
+                                columns=['Predicted negative', 'Predicted positive'])
+
+    print('AUC on test: %0.3f' % metrics['auc'] if metrics['auc'] is not None else 'AUC on test: undefined')
+    print('Accuracy on test: %0.3f' % metrics['accuracy'] if metrics['accuracy'] is not None else
+          'Accuracy on test: undefined')
+    print()
+    print(confusion_df)
+
+
+def save_metrics(metrics: dict, path: str) -> None:
+    """Write a metrics summary to a JSON file.
+
+    :param metrics: dict - metrics summary
+    :param path: str - output path
+    :return: None
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    logger.info(f'Metrics saved to {path}.')
+
+
+@profiled
+def evaluation(y_test: pd.DataFrame, pred_df: pd.DataFrame, thresholds=101, n_bins: int = 100000) -> dict:
+    """evaluate model performance on test set.
+
+    :param y_test: :obj: pandas dataframe of actual y's
+    :param pred_df: pandas dataframe of predicted y's
+    :param thresholds: int or list - decision thresholds to evaluate, see `StreamingEvaluator`
+    :param n_bins: int - number of probability bins of the AUC histograms
+    :return: dict - metrics, see `StreamingEvaluator.metrics`
+    """
+    evaluator = StreamingEvaluator(thresholds, n_bins)
+    evaluator.update(y_test, pred_df['ypred_proba'], pred_df['ypred_bin'])
+    metrics = evaluator.metrics()
+    print_metrics(metrics)
+
+    return metrics
+
+
+@profiled
+def evaluate_chunks(chunks, thresholds=101, n_bins: int = 100000) -> dict:
+    """evaluate model performance on predictions that arrive in chunks, e.g. from `src.artifacts.iter_artifact`.
+
+    :param chunks: iterable - pandas dataframes of predicted y's alongside the actual 'class'
+    :param thresholds: int or list - decision thresholds to evaluate, see `StreamingEvaluator`
+    :param n_bins: int - number of probability bins of the AUC histograms
+    :return: dict - metrics, see `StreamingEvaluator.metrics`
+    """
+    evaluator = StreamingEvaluator(thresholds, n_bins)
+    for chunk in chunks:
+        evaluator.update(chunk['class'], chunk['ypred_proba'], chunk['ypred_bin'])
+    metrics = evaluator.metrics()
+    print_metrics(metrics)
+
+    return metrics
@@ -0,0 +1,201 @@
+import copy
+import json
+import os
+import tempfile
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from src import evaluate_model, profiling
+from src.cache import StepCache, code_version, hash_file, step_key
+from src.evaluate_model import StreamingEvaluator
+from src.feature_generation import feature_gen
+from src.pipeline import read, featurize, train, cache_key, metric_options, side_output_paths, train_config
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+STEPS = ['read', 'featurize', 'train', 'evaluate']
+
+
+def apply_overrides(config: dict, overrides: dict) -> dict:
+    """Apply experiment overrides to a copy of a config.
+
+    :param config: dict - base config
+    :param overrides: dict - nested sections and/or dotted keys (e.g. 'train_model.model_params.max_depth')
+                             mapped to the values that replace those in the base config
+    :return: dict - overridden config
+    """
+    config = copy.deepcopy(config)
+    for key, value in overrides.items():
+        *sections, name = key.split('.')
+        target = config
+        for section in sections:
+            target = target.setdefault(section, {})
+        if isinstance(value, dict) and isinstance(target.get(name), dict):
+            target[name] = apply_overrides(target[name], value)
+        else:
+            target[name] = copy.deepcopy(value)
+    return config
+
+
+def experiment_config(config: dict, overrides: dict) -> dict:
+    """Build the config of one experiment.
+
+    Experiments are compared rather than deployed, so the base config's saved model path is dropped; an
+    experiment can still save its model by overriding 'train_model.save_model.path'.
+
+    :param config: dict - base config
+    :param overrides: dict - experiment overrides, see `apply_overrides`
+    :return: dict - experiment config
+    """
+    config = copy.deepcopy(config)
+    config["train_model"].pop("save_model", None)
+    return apply_overrides(config, overrides)
+
+
+def node_key(step: str, input_hash: str, config: dict) -> str:
+    """Build the key of a step in the experiment DAG; experiments whose step has the same key share it.
+
+    :param step: str - one of `STEPS`
+    :param input_hash: str - hash of the raw data for 'read', otherwise the key of the step's parent
+    :param config: dict - experiment config
+    :return: str - step key, the same as the pipeline's cache key for 'read', 'featurize' and 'train'
+    """
+    if step == 'evaluate':
+        return step_key(step, input_hash, metric_options(config.get("evaluate_model", {})),
+                        code_version(evaluate_model))
+    return cache_key(step, input_hash, config)
+
+
+def build_dag(path: str, configs: dict) -> tuple:
+    """Build the DAG of read -> featurize -> train -> evaluate steps of several experiments.
+
+    :param path: str - path to raw cloud data text file
+    :param configs: dict - experiment name -> experiment config
+    :return: tuple - dict of step key -> node ('step', 'config', 'parent' key and 'experiments' sharing it) in
+                     topological order, and dict of experiment name -> key of its evaluate step
+    """
+    input_hash = hash_file(path)
+    nodes, leaves = {}, {}
+    for name, config in configs.items():
+        parent = None
+        for step in STEPS:
+            key = node_key(step, parent or input_hash, config)
+            if key not in nodes:
+                nodes[key] = {'step': step, 'config': config, 'parent': parent, 'experiments': []}
+            nodes[key]['experiments'].append(name)
+            parent = key
+        leaves[name] = parent
+    return nodes, leaves
+
+
+def run_node(key: str, nodes: dict, path: str, cache: StepCache):
+    """Get the output of a DAG step from the cache, running it (and any uncached ancestors) on a miss.
+
+    :param key: str - step key
+    :param nodes: dict - DAG nodes, see `build_dag`
+    :param path: str - path to raw cloud data text file
+    :param cache: :obj: StepCache - cache the step outputs are exchanged through
+    :return: step output: a dataframe, or the metrics dict of an evaluate step
+    """
+    node = nodes[key]
+    config = node['config']
+    # an experiment that saves its model gets it back with the cached predictions
+    paths = side_output_paths('train', config) if node['step'] == 'train' else {}
+    output = cache.get(key)
+    if output is not None and cache.get_files(key, paths):
+        return output
+    data = run_node(node['parent'], nodes, path, cache) if node['parent'] is not None else None
+
+    logger.info(f"Running {node['step']} for experiments {node['experiments']}.")
+    if node['step'] == 'read':
+        output = read(path, config["load_data"])
+    elif node['step'] == 'featurize':
+        output = featurize(data, config["generate_features"], config["train_model"]["fit_model"]["features_list"],
+                           save_snapshots=False)
+    elif node['step'] == 'train':
+        output = train(data, train_config(config))
+    else:
+        evaluator = StreamingEvaluator(**metric_options(config.get("evaluate_model", {})))
+        pred, y_test = feature_gen(data)
+        evaluator.update(y_test, pred['ypred_proba'], pred['ypred_bin'])
+        output = evaluator.metrics()
+    cache.put(key, output)
+    cache.put_files(key, paths)
+    return output
+
+
+def _run_task(key, nodes, path, cache_config):
+    output = run_node(key, nodes, path, StepCache(**cache_config))
+    # dataframes are handed on through the cache; only the small metrics dicts come back to the scheduler
+    return output if nodes[key]['step'] == 'evaluate' else None
+
+
+def run_experiments(path: str, config: dict, experiments: dict, n_jobs: int = -1) -> pd.DataFrame:
+    """Run several variants of the pipeline config, sharing the steps they have in common.
+
+    Each distinct step runs once, however many experiments share it. Steps whose parent has finished run in
+    parallel worker processes, and outputs are passed between steps through the step cache (a temporary one
+    if caching is disabled in the config), so steps cached by earlier runs are not rerun either.
+
+    :param path: str - path to raw cloud data text file
+    :param config: dict - base pipeline config
+    :param experiments: dict - experiment name -> overrides of the base config, see `apply_overrides`
+    :param n_jobs: int - number of worker processes; 1 runs every step in this process and -1 uses all cores
+    :return: :obj: pandas dataframe - one row per experiment with its overrides and metrics, best AUC first
+    """
+    if not experiments:
+        raise ValueError("No experiments to run.")
+    configs = {name: experiment_config(config, overrides or {}) for name, overrides in experiments.items()}
+    nodes, leaves = build_dag(path, configs)
+    logger.info(f'{len(configs)} experiments share {len(nodes)} of {len(configs) * len(STEPS)} steps.')
+
+    cache_config = dict(config.get("cache", {}), enabled=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        if not config.get("cache", {}).get("enabled", False):
+            cache_config = {'dir': tmp, 'max_size_mb': float('inf')}
+        results = _schedule(nodes, path, cache_config, os.cpu_count() if n_jobs == -1 else n_jobs)
+
+    rows = []
+    for name, overrides in experiments.items():
+        metrics = results[leaves[name]]
+        rows.append(dict({'experiment': name}, **_flatten(overrides or {}),
+                         auc=metrics['auc'], accuracy=metrics['accuracy'], test_rows=metrics['rows']))
+    return pd.DataFrame(rows).sort_values('auc', ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+def _schedule(nodes, path, cache_config, n_jobs):
+    if n_jobs == 1:
+        return {key: _run_task(key, nodes, path, cache_config) for key in nodes}
+
+    children = defaultdict(list)
+    for key, node in nodes.items():
+        if node['parent'] is not None:
+            children[node['parent']].append(key)
+
+    results = {}
+    with ProcessPoolExecutor(n_jobs) as executor:
+        running = {executor.submit(profiling.unprofiled, _run_task, key, nodes, path, cache_config): key
+                   for key, node in nodes.items() if node['parent'] is None}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                results[key] = future.result()
+                for child in children[key]:
+                    running[executor.submit(profiling.unprofiled, _run_task, child, nodes, path, cache_config)] = child
+    return results
+
+
+def _flatten(overrides, prefix=''):
+    flat = {}
+    for key, value in overrides.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        else:
+            # lists such as a features list go into one cell
+            flat[f'{prefix}{key}'] = json.dumps(value) if isinstance(value, (list, tuple)) else value
+    return flat
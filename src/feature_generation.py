@@ -1,60 +1,157 @@
-import pandas as pd
-import numpy as np
-
-
-def feature_gen(data: pd.DataFrame) -> tuple:
-    """generate features and labels and write to local csv.
-
-    :param data: :obj: pandas dataframe - data to be fed
-    :returns tuple - tuple of pandas dataframe consisting of features and labels
-    """
-    features = data.drop('class', axis=1)
-    target = data['class']
-
-    return features, target
-
-
-def add_log_entropy(features: pd.DataFrame) -> pd.DataFrame:
-    """Add log entropy as a feature.
-
-    :param features: :obj: pandas dataframe - features to be fed
-    :return: :obj pandas dataframe - output features with additional column
-    """
-    features['log_entropy'] = features.visible_entropy.apply(np.log)
-
-    return features
-
-
-def add_entropy_x_contrast(features: pd.DataFrame) -> pd.DataFrame:
-    """Add entropy x contrast as a feature.
-
-    :param features: :obj: pandas dataframe - features to be fed
-    :return: :obj pandas dataframe - output features with additional column
-    """
-    features['entropy_x_contrast'] = features.visible_contrast.multiply(
-        features.visible_entropy)
-
-    return features
-
-
-def add_ir_range(features: pd.DataFrame) -> pd.DataFrame:
-    """Add IR range as a feature.
-
-    :param features: :obj: pandas dataframe - features to be fed
-    :return: :obj pandas dataframe - output features with additional column
-    """
-    features['IR_range'] = features.IR_max - features.IR_min
-
-    return features
-
-
-def add_ir_norm_range(features: pd.DataFrame) -> pd.DataFrame:
-    """Add IR norm range as a feature.
-
-    :param features: :obj: pandas dataframe - features to be fed
-    :return: :obj pandas dataframe - output features with additional column
-    """
-    features['IR_norm_range'] = (features.IR_max - features.IR_min).divide(
-        features.IR_mean)
-
-    return features
+import pandas as pd
+import numpy as np
+
+from src.profiling import profiled
+
+
+def feature_gen(data: pd.DataFrame) -> tuple:
+    """generate features and labels and write to local csv.
+
+    :param data: :obj: pandas dataframe - data to be fed
+    :returns tuple - tuple of pandas dataframe consisting of features and labels
+    """
+    features = data.drop('class', axis=1)
+    target = data['class']
+
+    return features, target
+
+
+def add_log_entropy(features: pd.DataFrame) -> pd.DataFrame:
+    """Add log entropy as a feature.
+
+    :param features: :obj: pandas dataframe - features to be fed
+    :return: :obj pandas dataframe - output features with additional column
+    """
+    features['log_entropy'] = np.log(features.visible_entropy)
+
+    return features
+
+
+def add_entropy_x_contrast(features: pd.DataFrame) -> pd.DataFrame:
+    """Add entropy x contrast as a feature.
+
+    :param features: :obj: pandas dataframe - features to be fed
+    :return: :obj pandas dataframe - output features with additional column
+    """
+    features['entropy_x_contrast'] = features.visible_contrast.multiply(
+        features.visible_entropy)
+
+    return features
+
+
+def add_ir_range(features: pd.DataFrame) -> pd.DataFrame:
+    """Add IR range as a feature.
+
+    :param features: :obj: pandas dataframe - features to be fed
+    :return: :obj pandas dataframe - output features with additional column
+    """
+    features['IR_range'] = features.IR_max - features.IR_min
+
+    return features
+
+
+def add_ir_norm_range(features: pd.DataFrame) -> pd.DataFrame:
+    """Add IR norm range as a feature.
+
+    :param features: :obj: pandas dataframe - features to be fed
+    :return: :obj pandas dataframe - output features with additional column
+    """
+    ir_range = features['IR_range'] if 'IR_range' in features else features.IR_max - features.IR_min
+    features['IR_norm_range'] = ir_range.divide(features.IR_mean)
+
+    return features
+
+
+# feature name -> (names of the columns or features it is computed from, numpy ufunc combining them)
+FEATURES = {
+    'log_entropy': (['visible_entropy'], np.log),
+    'entropy_x_contrast': (['visible_contrast', 'visible_entropy'], np.multiply),
+    'IR_range': (['IR_max', 'IR_min'], np.subtract),
+    'IR_norm_range': (['IR_range', 'IR_mean'], np.divide)
+}
+
+# feature generation step -> feature it adds, in the order the steps are run
+FEATURE_STEPS = {
+    'add_log_entropy': 'log_entropy',
+    'add_entropy_x_contrast': 'entropy_x_contrast',
+    'add_ir_range': 'IR_range',
+    'add_ir_norm_range': 'IR_norm_range'
+}
+
+
+def feature_plan(features_list: list) -> list:
+    """Order the registered features needed for `features_list` so that dependencies come first.
+
+    :param features_list: list - names of features to compute; names not in `FEATURES` are taken as input columns
+    :return: list - registered feature names in evaluation order
+    """
+    plan = []
+
+    def visit(name, path):
+        if name not in FEATURES or name in plan:
+            return
+        if name in path:
+            raise ValueError(f"Circular feature dependency: {' -> '.join(path + (name,))}.")
+        for dependency in FEATURES[name][0]:
+            visit(dependency, path + (name,))
+        plan.append(name)
+
+    for name in features_list:
+        visit(name, ())
+
+    return plan
+
+
+def feature_inputs(features_list: list) -> list:
+    """List the input columns that the features in `features_list` are computed from.
+
+    :param features_list: list - names of features; names not in `FEATURES` are taken as input columns
+    :return: list - input column names
+    """
+    plan = feature_plan(features_list)
+    inputs = [name for name in features_list if name not in FEATURES]
+    inputs += [dependency for name in plan for dependency in FEATURES[name][0] if dependency not in FEATURES]
+    return list(dict.fromkeys(inputs))
+
+
+@profiled
+def compute_features(data: pd.DataFrame, features_list: list, block_size: int = 65536,
+                     dtype: type = np.float32) -> dict:
+    """Compute registered features in one fused, vectorized pass over blocks of rows.
+
+    Every feature needed by `features_list` is evaluated once per block of rows, so intermediate results
+    (e.g. 'IR_range' for 'IR_norm_range') are shared and stay in cache; only the requested features are kept.
+
+    :param data: :obj: pandas dataframe - input columns
+    :param features_list: list - names of features to compute
+    :param block_size: int - number of rows evaluated together
+    :param dtype: numpy dtype - dtype the inputs are cast to and the features are computed in
+    :return: dict - feature name -> numpy array, for each registered feature in `features_list`
+    """
+    plan = feature_plan(features_list)
+    inputs = {dependency for name in plan for dependency in FEATURES[name][0] if dependency not in FEATURES}
+    columns = {column: np.ascontiguousarray(data[column].to_numpy(), dtype=dtype) for column in inputs}
+
+    n_rows = len(data)
+    output = {name: np.empty(n_rows, dtype=dtype) for name in features_list if name in FEATURES}
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        values = {column: array[start:stop] for column, array in columns.items()}
+        for name in plan:
+            dependencies, func = FEATURES[name]
+            out = output[name][start:stop] if name in output else None
+            values[name] = func(*[values[dependency] for dependency in dependencies], out=out)
+
+    return output
+
+
+def generate_features(features: pd.DataFrame, features_list: list) -> pd.DataFrame:
+    """Add the registered features in `features_list` to the input features.
+
+    :param features: :obj: pandas dataframe - features to be fed
+    :param features_list: list - names of features to compute
+    :return: :obj pandas dataframe - output features with one additional column per computed feature
+    """
+    computed = compute_features(features, features_list)
+
+    return pd.concat([features, pd.DataFrame(computed, index=features.index)], axis=1)
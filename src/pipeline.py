@@ -0,0 +1,400 @@
+import functools
+import importlib
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from src import profiling
+from src.artifacts import ArtifactWriter, iter_artifact, write_artifact
+from src.cache import StepCache, code_version, hash_file, step_key
+from src.data_acquisition import load_data
+from src.feature_generation import feature_gen, compute_features, FEATURE_STEPS
+from src.evaluate_model import evaluation, evaluate_chunks, save_metrics
+from src.profiling import profiled
+from src.schema import LABEL, ROW_ID, feature_matrix
+
+logger = logging.getLogger(__name__)
+
+# modules whose code a step's output depends on, besides this one; their source is part of the step's cache key
+STEP_MODULES = {
+    'read': ['src.data_acquisition', 'src.schema'],
+    'featurize': ['src.feature_generation', 'src.schema'],
+    'train': ['src.train_model', 'src.splitting', 'src.schema'],
+}
+
+
+@profiled
+def read(path: str, load_config: dict) -> pd.DataFrame:
+    """Parse the raw cloud data file into a dataframe.
+
+    :param path: str - path to raw cloud data text file
+    :param load_config: dict - 'load_data' section of the config
+    :return: :obj: pandas dataframe - cloud data with class labels
+    """
+    return load_data(path, **load_config)
+
+
+@profiled
+def featurize(data: pd.DataFrame, feature_config: dict, features_list: list, save_snapshots: bool = True,
+              fmt: str = 'auto', schema: dict = None) -> pd.DataFrame:
+    """Generate the features used by the model for the cloud data.
+
+    Only the features in `features_list` (plus those needed by any configured snapshot) are computed.
+
+    :param data: :obj: pandas dataframe - cloud data with class labels
+    :param feature_config: dict - 'generate_features' section of the config
+    :param features_list: list - features used by the model
+    :param save_snapshots: bool - if True, write the per-step outputs whose paths are set in the config
+    :param fmt: str - artifact format of the per-step outputs, see `src.artifacts.resolve_format`
+    :param schema: dict - if given, column order and dtypes of the per-step outputs, see `src.schema.build_schema`
+    :return: :obj: pandas dataframe - input columns, model features and labels
+    """
+    # users have the option to specify output paths and download granular feature files
+    paths = snapshot_paths(feature_config) if save_snapshots else {}
+    frames = featurize_chunk(data, features_list, list(paths))
+    for name, path in paths.items():
+        # the matrix keeps the features list's column order rather than the schema's
+        if name == 'matrix':
+            write_artifact(frames[name], path, 'matrix')
+        else:
+            write_artifact(frames[name], path, fmt, schema)
+
+    return frames['output']
+
+
+@profiled
+def featurize_stream(path: str, output_path: str, feature_config: dict, features_list: list,
+                     save_snapshots: bool = True, fmt: str = 'auto', chunksize: int = 100000, n_jobs: int = 1,
+                     schema: dict = None) -> int:
+    """Generate features chunk by chunk, appending each chunk to the output and snapshot files.
+
+    Memory is bounded by `chunksize` (times the number of chunks in flight) rather than by the input size.
+    The output is the same as that of `featurize`.
+
+    :param path: str - path to cloud data with class labels
+    :param output_path: str - output path
+    :param feature_config: dict - 'generate_features' section of the config
+    :param features_list: list - features used by the model
+    :param save_snapshots: bool - if True, write the per-step outputs whose paths are set in the config
+    :param fmt: str - artifact format of the input, output and per-step outputs, see `src.artifacts.resolve_format`
+    :param chunksize: int - number of rows read and featurized at a time
+    :param n_jobs: int - number of worker processes featurizing chunks; -1 uses all cores
+    :param schema: dict - if given, column order and dtypes of the input and outputs, see `src.schema.build_schema`
+    :return: int - number of rows written
+    """
+    paths = dict(snapshot_paths(feature_config) if save_snapshots else {}, output=output_path)
+    # the matrix keeps the features list's column order rather than the schema's
+    writers = {name: ArtifactWriter(output, 'matrix', None) if name == 'matrix' else ArtifactWriter(output, fmt, schema)
+               for name, output in paths.items()}
+    work = functools.partial(featurize_chunk, features_list=features_list, snapshots=list(paths))
+
+    n_rows = 0
+    for frames in map_ordered(work, iter_artifact(path, fmt, chunksize, schema), n_jobs):
+        for name, writer in writers.items():
+            writer.write(frames[name])
+        n_rows += len(frames['output'])
+    for writer in writers.values():
+        writer.close()
+    logger.info(f'Featurized {n_rows} rows in chunks of {chunksize}.')
+
+    return n_rows
+
+
+def featurize_chunk(data: pd.DataFrame, features_list: list, snapshots: list = ()) -> dict:
+    """Compute the model data and the requested snapshots for a block of cloud data.
+
+    :param data: :obj: pandas dataframe - cloud data with class labels
+    :param features_list: list - features used by the model
+    :param snapshots: list - snapshots to build: 'features', 'labels', 'matrix' and/or names of `FEATURE_STEPS`
+    :return: dict - 'output' (input columns, model features and labels) and each requested snapshot
+    """
+    features, labels = feature_gen(data)
+    frames = {name: frame for name, frame in [('features', features), ('labels', labels)] if name in snapshots}
+
+    # each snapshot holds the features of all steps up to and including its own
+    steps = list(FEATURE_STEPS)
+    snapshot_steps = [step for step in steps if step in snapshots]
+    snapshot_features = [FEATURE_STEPS[step] for step in steps[:steps.index(snapshot_steps[-1]) + 1]] \
+        if snapshot_steps else []
+
+    computed = compute_features(features, list(features_list) + snapshot_features)
+    for step in snapshot_steps:
+        added = snapshot_features[:steps.index(step) + 1]
+        frames[step] = pd.concat([features, pd.DataFrame({name: computed[name] for name in added},
+                                                         index=features.index)], axis=1)
+
+    model_features = pd.DataFrame({name: computed[name] for name in features_list if name in computed},
+                                  index=features.index)
+    frames['output'] = pd.concat([features, model_features, labels], axis=1)
+    if 'matrix' in snapshots:
+        # just what the model reads, in the order it reads it
+        frames['matrix'] = frames['output'][list(features_list) + [labels.name]]
+    return frames
+
+
+def snapshot_paths(feature_config: dict) -> dict:
+    """Map each featurize snapshot whose path is set in the config to that path.
+
+    :param feature_config: dict - 'generate_features' section of the config
+    :return: dict - 'features', 'labels', 'matrix' and/or names of `FEATURE_STEPS` -> output path
+    """
+    paths = {}
+    if feature_config["feature_gen"].get("features_output_path") is not None and \
+       feature_config["feature_gen"].get("labels_output_path") is not None:
+        paths['features'] = feature_config["feature_gen"]["features_output_path"]
+        paths['labels'] = feature_config["feature_gen"]["labels_output_path"]
+    if feature_config["feature_gen"].get("matrix_output_path") is not None:
+        paths['matrix'] = feature_config["feature_gen"]["matrix_output_path"]
+    for step in FEATURE_STEPS:
+        if feature_config.get(step, {}).get("output_path") is not None:
+            paths[step] = feature_config[step]["output_path"]
+    return paths
+
+
+def map_ordered(func, items, n_jobs: int = 1):
+    """Apply a function to items in worker processes, yielding results in input order.
+
+    At most two items per worker are in flight, so a lazily generated input is never read far ahead.
+
+    :param func: callable - picklable function of one item
+    :param items: iterable - inputs
+    :param n_jobs: int - number of worker processes; 1 runs in this process and -1 uses all cores
+    :return: generator - yields results in the order of `items`
+    """
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if n_jobs == 1:
+        yield from map(func, items)
+        return
+
+    with ProcessPoolExecutor(n_jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(profiling.unprofiled, func, item))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+@profiled
+def train(data: pd.DataFrame, model_config: dict) -> pd.DataFrame:
+    """Split featurized data, fit the random forest and predict on the test set.
+
+    :param data: :obj: pandas dataframe - features and labels
+    :param model_config: dict - 'train_model' section of the config
+    :return: :obj: pandas dataframe - test set predictions alongside the actual class
+    """
+    features, labels = feature_gen(data)
+    # materialize the model features once; the split and the model then work on plain arrays
+    X = feature_matrix(features, model_config['fit_model']['features_list'])
+
+    group_column = model_config.get('group_column')
+    groups = data[group_column].to_numpy() if group_column is not None else None
+
+    return train_matrix(X, labels.to_numpy(), model_config, labels.name, groups)
+
+
+@profiled
+def train_matrix(X: np.ndarray, y: np.ndarray, model_config: dict, label: str = LABEL,
+                 groups: np.ndarray = None) -> pd.DataFrame:
+    """Split a feature matrix, fit the random forest and predict on the test set.
+
+    The split yields row indices, and the train and test rows are each gathered from `X` once, as the model
+    reads them.
+
+    :param X: :obj: numpy array - n_rows x n_features matrix whose columns are the features list, e.g. memory-mapped
+                                 by `src.artifacts.open_matrix`
+    :param y: :obj: numpy array - labels
+    :param model_config: dict - 'train_model' section of the config
+    :param label: str - name of the actual class column of the output
+    :param groups: :obj: numpy array - group of each row, required if 'group_column' is set in `model_config`
+    :return: :obj: pandas dataframe - test set predictions with their row ids in `X` ('row_id') alongside the
+                                       actual class
+    """
+    # sklearn is imported only by the steps that fit a model, so the other steps start quickly
+    from src.splitting import split_indices
+    from src.train_model import fit_model
+
+    if model_config.get('group_column') is not None and groups is None:
+        raise ValueError(f"Splitting by '{model_config['group_column']}' needs the group of each row.")
+    train_idx, test_idx = split_indices(y, **model_config['train_test_split'], groups=groups)
+    pred = fit_model(X[train_idx], y[train_idx], X[test_idx], **model_config['fit_model'],
+                     **model_config['model_params'], model_path=model_config.get('save_model', {}).get('path'))
+    # the row ids join the predictions back to the input rows, e.g. with `data.iloc[pred[ROW_ID]]`
+    pred.insert(0, ROW_ID, test_idx)
+    pred[label] = y[test_idx]
+
+    return pred
+
+
+@profiled
+def evaluate(data: pd.DataFrame, evaluate_config: dict = None) -> dict:
+    """Print evaluation metrics for a predictions dataframe.
+
+    :param data: :obj: pandas dataframe - predictions alongside the actual class
+    :param evaluate_config: dict - 'evaluate_model' section of the config; metrics are written to its
+                                   'metrics_path', if set
+    :return: dict - metrics, see `src.evaluate_model.StreamingEvaluator.metrics`
+    """
+    evaluate_config = evaluate_config or {}
+    pred, y_test = feature_gen(data)
+    metrics = evaluation(y_test, pred, **metric_options(evaluate_config))
+    if evaluate_config.get("metrics_path") is not None:
+        save_metrics(metrics, evaluate_config["metrics_path"])
+
+    return metrics
+
+
+@profiled
+def evaluate_file(path: str, evaluate_config: dict = None, fmt: str = 'auto', schema: dict = None) -> dict:
+    """Print evaluation metrics for a predictions artifact, reading it in chunks so it need not fit in memory.
+
+    :param path: str - path to predictions alongside the actual class
+    :param evaluate_config: dict - 'evaluate_model' section of the config; the artifact is read in chunks of its
+                                   'chunksize' rows and metrics are written to its 'metrics_path', if set
+    :param fmt: str - artifact format, see `src.artifacts.resolve_format`
+    :param schema: dict - if given, column order and dtypes to read the data in, see `src.schema.build_schema`
+    :return: dict - metrics, see `src.evaluate_model.StreamingEvaluator.metrics`
+    """
+    evaluate_config = evaluate_config or {}
+    chunks = iter_artifact(path, fmt, evaluate_config.get("chunksize", 100000), schema)
+    metrics = evaluate_chunks(chunks, **metric_options(evaluate_config))
+    if evaluate_config.get("metrics_path") is not None:
+        save_metrics(metrics, evaluate_config["metrics_path"])
+
+    return metrics
+
+
+def metric_options(evaluate_config: dict) -> dict:
+    """Pick out the settings of `src.evaluate_model.StreamingEvaluator` from the 'evaluate_model' config section.
+
+    :param evaluate_config: dict - 'evaluate_model' section of the config
+    :return: dict - 'thresholds' and 'n_bins', where set
+    """
+    return {name: evaluate_config[name] for name in ["thresholds", "n_bins"] if name in evaluate_config}
+
+
+def train_config(config: dict) -> dict:
+    """Get the 'train_model' config section, with the tuned parameters merged in if it asks for them.
+
+    :param config: dict - full pipeline config
+    :return: dict - 'train_model' section whose 'model_params' include the `tune` step's best parameters
+                    when 'use_tuned_params' is set and the parameters file exists
+    """
+    model_config = config["train_model"]
+    path = config.get("tune_model", {}).get("best_params_path")
+    if not model_config.get("use_tuned_params", False) or path is None or not os.path.exists(path):
+        return model_config
+    with open(path, "r") as f:
+        tuned = yaml.safe_load(f)
+    logger.info(f'Using tuned parameters {tuned} from {path}.')
+    return dict(model_config, model_params=dict(model_config["model_params"], **tuned))
+
+
+def step_config(step: str, config: dict) -> dict:
+    """Pick out the config subsections a step's output depends on.
+
+    :param step: str - one of 'read', 'featurize' or 'train'
+    :param config: dict - full pipeline config
+    :return: dict - config subsections used by the step
+    """
+    if step == 'read':
+        return {'load_data': config['load_data']}
+    elif step == 'featurize':
+        return {'generate_features': config['generate_features'],
+                'features_list': config['train_model']['fit_model']['features_list']}
+    elif step == 'train':
+        return {'train_model': train_config(config)}
+    raise ValueError(f"Step '{step}' has no cacheable output.")
+
+
+def cache_key(step: str, input_hash: str, config: dict, fmt: str = None) -> str:
+    """Build the cache key of a step from its input, its config subsections and its code.
+
+    :param step: str - one of 'read', 'featurize' or 'train'
+    :param input_hash: str - hash of the step's input data, or the cache key of the step producing it
+    :param config: dict - full pipeline config
+    :param fmt: str - storage format of the cached output, if it is cached as a file
+    :return: str - cache key
+    """
+    code = code_version(*[importlib.import_module(module) for module in STEP_MODULES[step]], sys.modules[__name__])
+    return step_key(step, input_hash, dict(step_config(step, config), format=fmt), code)
+
+
+def side_output_paths(step: str, config: dict) -> dict:
+    """Map each file a step writes besides its main output, as set in the config, to its path.
+
+    The cache stores these files with the step's output and restores them with it, so that a cache hit leaves
+    the same files on disk as running the step would.
+
+    :param step: str - one of 'read', 'featurize' or 'train'
+    :param config: dict - full pipeline config
+    :return: dict - output name -> path
+    """
+    if step == 'featurize':
+        return snapshot_paths(config["generate_features"])
+    elif step == 'train' and "path" in config["train_model"].get("save_model", {}):
+        return {'model': config["train_model"]["save_model"]["path"]}
+    return {}
+
+
+def run_pipeline(path: str, config: dict, save_intermediate: bool = False, cache: StepCache = None,
+                 schema: dict = None) -> pd.DataFrame:
+    """Run read, featurize, train and evaluate in one process, passing dataframes in memory.
+
+    :param path: str - path to raw cloud data text file
+    :param config: dict - full pipeline config
+    :param save_intermediate: bool - if True, write the intermediate outputs whose paths are set in the
+                                     'pipeline' section of the config, plus the feature snapshots
+    :param cache: :obj: StepCache - if given, reuse the outputs of steps whose input, config and code are unchanged
+    :param schema: dict - if given, column order and dtypes of the intermediate outputs, see `src.schema.build_schema`
+    :return: :obj: pandas dataframe - test set predictions alongside the actual class
+    """
+    output_paths = config.get("pipeline", {}) if save_intermediate else {}
+    fmt = config.get("artifacts", {}).get("format", "auto")
+    cache = cache if cache is not None else StepCache(enabled=False)
+
+    # each step's key chains on the key of the step before it, so only the raw file is hashed;
+    # upstream steps are only loaded or run when a downstream step misses the cache
+    read_key = cache_key('read', hash_file(path), config) if cache.enabled else None
+    featurize_key = cache_key('featurize', read_key, config) if cache.enabled else None
+    train_key = cache_key('train', featurize_key, config) if cache.enabled else None
+
+    def get_data():
+        data = cache.get_or_compute(read_key, lambda: read(path, config["load_data"]))
+        if "read" in output_paths:
+            write_artifact(data, output_paths["read"]["output_path"], fmt, schema)
+            logger.info(f'Output saved to {output_paths["read"]["output_path"]}.')
+        return data
+
+    def get_features():
+        data = get_data() if save_intermediate else None
+
+        def compute():
+            return featurize(data if data is not None else get_data(), config["generate_features"],
+                             config["train_model"]["fit_model"]["features_list"],
+                             save_snapshots=save_intermediate, fmt=fmt, schema=schema)
+
+        # the snapshots are side outputs of featurize, restored with its output
+        snapshots = side_output_paths('featurize', config) if save_intermediate else {}
+        features = cache.get_or_compute(featurize_key, compute, snapshots)
+        if "featurize" in output_paths:
+            write_artifact(features, output_paths["featurize"]["output_path"], fmt, schema)
+            logger.info(f'Output saved to {output_paths["featurize"]["output_path"]}.')
+        return features
+
+    def get_pred():
+        return train(features if features is not None else get_features(), train_config(config))
+
+    # the saved model is a side output of train, restored with the predictions so it is the model that made them
+    features = get_features() if save_intermediate else None
+    pred = cache.get_or_compute(train_key, get_pred, side_output_paths('train', config))
+    evaluate(pred, config.get("evaluate_model"))
+
+    return pred
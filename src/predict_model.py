@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from src.feature_generation import compute_features
+from src.profiling import profiled
+from src.schema import feature_matrix
+from src.train_model import predict_scores
+from src.tree_inference import flatten_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@profiled
+def predict(bundle: dict, data, batch_size: int = 100000, n_jobs: int = 1,
+            threshold: float = 0.5, engine: str = 'sklearn') -> pd.DataFrame:
+    """Score data with a saved model in batches.
+
+    Features in the model's features list that are missing from `data` are computed from the input columns. A
+    feature matrix (e.g. memory-mapped by `src.artifacts.open_matrix`) is scored in place, batch by batch.
+
+    :param bundle: dict - model and features list, as returned by `src.train_model.load_model`
+    :param data: :obj: pandas dataframe - featurized (or raw) data to score, or :obj: numpy array - matrix whose
+                 columns are the model's features list; missing values raise a ValueError
+    :param batch_size: int - number of rows scored per call to the model
+    :param n_jobs: int - number of batches scored in parallel threads; -1 uses all cores
+    :param threshold: float - predict the positive class where its probability is above this
+    :param engine: str - 'sklearn', or 'numpy' or 'numba' to score with the forest flattened into node arrays,
+                         see `src.tree_inference.FlatForest`
+    :return: :obj: pandas dataframe - predicted probability of class 1 and predicted class for each row
+    """
+    model, features_list = flatten_model(bundle['model'], engine), bundle['features_list']
+    if isinstance(data, np.ndarray):
+        if data.ndim != 2 or data.shape[1] != len(features_list):
+            raise ValueError(f"Expected a matrix of the {len(features_list)} features {features_list}, "
+                             f"got shape {data.shape}.")
+        X = data
+    else:
+        missing = [name for name in features_list if name not in data]
+        if missing:
+            data = pd.concat([data, pd.DataFrame(compute_features(data, missing), index=data.index)], axis=1)
+        X = feature_matrix(data, features_list)
+
+    def score(start):
+        batch = X[start:start + batch_size]
+        # e.g. a row that lacks a feature other rows have; checked per batch so a memory-mapped X is not read twice
+        if not np.isfinite(batch).all():
+            raise ValueError("Input contains NaN or infinity, e.g. a row missing one of the features "
+                             f"{features_list} or the columns they are computed from.")
+        # a single ensemble pass gives both the probabilities and the predicted class
+        return predict_scores(model, batch, threshold)
+
+    # tree traversal releases the GIL, so threads share the model and X without copying them
+    batches = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(score)(start)
+                                                         for start in range(0, len(X), batch_size))
+    if not batches:
+        batches = [(np.empty(0), model.classes_[:0])]
+    df = pd.DataFrame({'ypred_proba': np.concatenate([proba for proba, _ in batches]),
+                       'ypred_bin': np.concatenate([label for _, label in batches])})
+    logger.debug(f'Scored {len(df)} rows in {len(batches)} batches.')
+
+    return df
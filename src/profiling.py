@@ -0,0 +1,176 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import time
+
+from src.cache import path_size
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Collect per-stage wall/CPU time, peak RSS, rows/sec and bytes read/written as JSON lines.
+
+    Stages nest: I/O recorded inside a function-level stage also counts towards the step that called it.
+    When disabled, stages cost one attribute check.
+    """
+
+    def __init__(self, metrics_path: str = None, enabled: bool = False):
+        """
+        :param metrics_path: str - JSONL file the stage records are appended to
+        :param enabled: bool - if False, nothing is recorded
+        """
+        self.metrics_path = metrics_path
+        self.enabled = enabled
+        self.records = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: int = None):
+        """Measure the enclosed block.
+
+        :param name: str - stage name
+        :param rows: int - number of rows processed, if known up front
+        :return: dict - the stage record; set its 'rows' key inside the block if only known afterwards
+        """
+        record = {'stage': name, 'rows': rows, 'bytes_read': 0, 'bytes_written': 0}
+        if not self.enabled:
+            yield record
+            return
+        record['parent'] = self._stack[-1]['stage'] if self._stack else None
+        self._stack.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            self._stack.pop()
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            record['peak_rss_mb'] = _peak_rss_mb()
+            record['rows_per_sec'] = record['rows'] / record['wall_s'] \
+                if record['rows'] is not None and record['wall_s'] > 0 else None
+            self.records.append(record)
+            self._write(record)
+
+    def record_io(self, kind: str, nbytes: int) -> None:
+        """Add bytes read or written to every open stage.
+
+        :param kind: str - 'read' or 'written'
+        :param nbytes: int - number of bytes
+        :return: None
+        """
+        if not self.enabled:
+            return
+        for record in self._stack:
+            record[f'bytes_{kind}'] += nbytes
+
+    def _write(self, record):
+        if self.metrics_path is None:
+            return
+        if os.path.dirname(self.metrics_path):
+            os.makedirs(os.path.dirname(self.metrics_path), exist_ok=True)
+        with open(self.metrics_path, 'a') as f:
+            f.write(json.dumps(dict(record, time=time.time())) + '\n')
+
+
+profiler = Profiler()
+
+
+def configure(metrics_path: str = None, enabled: bool = False) -> Profiler:
+    """Set up the process-wide profiler used by `stage`, `record_io` and `profiled`.
+
+    :param metrics_path: str - JSONL file the stage records are appended to
+    :param enabled: bool - if False, nothing is recorded
+    :return: :obj: Profiler - the process-wide profiler
+    """
+    profiler.metrics_path = metrics_path
+    profiler.enabled = enabled
+    profiler.records = []
+    return profiler
+
+
+def unprofiled(func, *args):
+    """Call a function in a worker process with the profiler it inherited switched off.
+
+    Forked workers inherit the parent's profiler, so without this they would write metrics of their own. (The
+    `initializer` argument of `ProcessPoolExecutor` could do this once per worker, but needs python 3.7.)
+
+    :param func: callable - function to call
+    :param args: arguments of `func`
+    :return: what `func` returns
+    """
+    configure()
+    return func(*args)
+
+
+def stage(name: str, rows: int = None):
+    """Measure the enclosed block with the process-wide profiler, see `Profiler.stage`."""
+    return profiler.stage(name, rows)
+
+
+def record_io(kind: str, path: str) -> None:
+    """Record the size of a file or directory artifact as bytes read or written.
+
+    :param kind: str - 'read' or 'written'
+    :param path: str - artifact path
+    :return: None
+    """
+    if profiler.enabled and os.path.exists(path):
+        profiler.record_io(kind, path_size(path))
+
+
+def profiled(func):
+    """Decorate a pipeline function so each call is recorded as a stage named after it.
+
+    The row count is taken from the first dataframe or array argument, or else from the result.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profiler.enabled:
+            return func(*args, **kwargs)
+        with profiler.stage(func.__name__, _rows(*args)) as record:
+            result = func(*args, **kwargs)
+            if record['rows'] is None:
+                record['rows'] = _rows(result)
+        return result
+    return wrapper
+
+
+@contextlib.contextmanager
+def cprofile(path: str = None):
+    """Run the enclosed block under cProfile and dump the stats to `path`; a no-op if `path` is None.
+
+    :param path: str - output .prof file, readable with pstats or snakeviz
+    """
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        profile.dump_stats(path)
+        logger.info(f'cProfile stats saved to {path}.')
+
+
+def _rows(*objs):
+    for obj in objs:
+        if hasattr(obj, 'shape') and len(obj.shape) > 0:
+            return int(obj.shape[0])
+    return None
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from src.feature_generation import FEATURES
+
+LABEL = 'class'
+# position of a prediction's row in the data it was made on
+ROW_ID = 'row_id'
+# RandomForestClassifier works in float32, so wider features would only be copied down before fitting
+FEATURE_DTYPE = np.dtype(np.float32)
+LABEL_DTYPE = np.dtype(np.int8)
+
+
+def build_schema(columns: list) -> dict:
+    """Build the column order and dtypes of cloud data.
+
+    :param columns: list - input columns, see 'load_data.columns' in the config
+    :return: dict - column name -> numpy dtype: the input columns and every registered feature as float32,
+                    followed by the int8 label
+    """
+    schema = {column: FEATURE_DTYPE for column in columns}
+    schema.update({name: FEATURE_DTYPE for name in FEATURES if name not in schema})
+    schema[LABEL] = LABEL_DTYPE
+    return schema
+
+
+def apply_schema(data: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Cast data to the schema dtypes and put its columns in schema order.
+
+    Columns that are already of the right dtype are not copied. Columns not in the schema (e.g. predictions)
+    keep their dtype and follow the schema columns in their original order.
+
+    :param data: :obj: pandas dataframe or series - data to conform
+    :param schema: dict - column name -> dtype, see `build_schema`
+    :return: :obj: pandas dataframe or series - conformed data
+    """
+    if isinstance(data, pd.Series):
+        return data.astype(schema[data.name]) if data.name in schema and data.dtype != schema[data.name] else data
+    order = [column for column in schema if column in data.columns] + \
+            [column for column in data.columns if column not in schema]
+    if list(data.columns) != order:
+        data = data[order]
+    dtypes = {column: schema[column] for column in order if column in schema and data[column].dtype != schema[column]}
+    return data.astype(dtypes) if dtypes else data
+
+
+def feature_matrix(features: pd.DataFrame, features_list: list) -> np.ndarray:
+    """Materialize model features as one C-contiguous float32 array, the layout the trees are built and scored in.
+
+    :param features: :obj: pandas dataframe - features
+    :param features_list: list - list of strings, features to use in the model, in column order
+    :return: :obj: numpy array - n_rows x len(features_list) float32 array
+    """
+    X = np.empty((len(features), len(features_list)), dtype=FEATURE_DTYPE)
+    for i, name in enumerate(features_list):
+        # fill column by column so no float64 or column-major intermediate is built
+        X[:, i] = features[name].to_numpy()
+    return X
@@ -0,0 +1,245 @@
+import json
+import queue
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pandas as pd
+
+from src.feature_generation import feature_inputs
+from src.predict_model import predict
+from src.tree_inference import flatten_model
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """Rolling request latency percentiles and overall throughput."""
+
+    def __init__(self, window: int = 10000):
+        """
+        :param window: int - number of most recent request latencies kept for the percentiles
+        """
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.batches = 0
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, latencies: list) -> None:
+        """Record the latencies of one scored batch.
+
+        :param latencies: list - seconds from submission to result, one per request in the batch
+        :return: None
+        """
+        with self._lock:
+            self.latencies.extend(latencies)
+            self.count += len(latencies)
+            self.batches += 1
+
+    def summary(self) -> dict:
+        """Summarize the recorded latencies.
+
+        :return: dict - request and batch counts, mean batch size, p50/p99 latency in ms and requests per second
+        """
+        with self._lock:
+            latencies = np.array(self.latencies)
+            count, batches = self.count, self.batches
+        elapsed = time.perf_counter() - self.start
+        p50, p99 = [float(p) * 1000 for p in np.percentile(latencies, [50, 99])] if len(latencies) else (None, None)
+        return {'requests': count,
+                'batches': batches,
+                'mean_batch_size': count / batches if batches else None,
+                'p50_ms': p50,
+                'p99_ms': p99,
+                'throughput_rps': count / elapsed if elapsed > 0 else None}
+
+
+class MicroBatcher:
+    """Collect single-row scoring requests into micro-batches scored by one vectorized call."""
+
+    def __init__(self, score, max_batch_size: int = 256, max_wait_ms: float = 5):
+        """
+        :param score: callable - takes a dataframe of rows and returns a dataframe of results, one row each
+        :param max_batch_size: int - most requests scored together
+        :param max_wait_ms: float - longest a request waits for more requests to join its batch
+        """
+        self.score = score
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = LatencyStats()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, row: dict) -> Future:
+        """Queue one row for scoring.
+
+        :param row: dict - column name -> value
+        :return: :obj: concurrent.futures.Future - resolves to a dict of results for the row
+        """
+        future = Future()
+        self._queue.put((time.perf_counter(), row, future))
+        return future
+
+    def close(self) -> None:
+        """Stop the batching thread once queued requests are scored.
+
+        :return: None
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._score(batch)
+
+    def _score(self, batch):
+        try:
+            results = self.score(pd.DataFrame([row for _, row, _ in batch])).to_dict('records')
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            # score rows one by one so a single malformed request does not fail the others in its batch
+            for item in batch:
+                self._score([item])
+            return
+        done = time.perf_counter()
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+        self.stats.record([done - submitted for submitted, _, _ in batch])
+
+
+def check_row(row: dict, features_list: list) -> dict:
+    """Check that a request row can be scored on its own, whatever other rows it is batched with.
+
+    Each of the model's features must either be in the row or be computable from input columns in it; null values
+    count as missing.
+
+    :param row: dict - column name -> value
+    :param features_list: list - features used by the model
+    :return: dict - the row without its null values
+    """
+    if not isinstance(row, dict):
+        raise ValueError(f'Expected a JSON object of columns, got {json.dumps(row)}.')
+    row = {name: value for name, value in row.items() if value is not None}
+    missing = [name for name in feature_inputs([name for name in features_list if name not in row])
+               if name not in row]
+    if missing:
+        raise ValueError(f'Row is missing {missing}, needed for the features {features_list}.')
+    return row
+
+
+def make_server(bundle: dict, host: str = '127.0.0.1', port: int = 8080, max_batch_size: int = 256,
+                max_wait_ms: float = 5, timeout: float = 30, threshold: float = 0.5,
+                engine: str = 'sklearn') -> HTTPServer:
+    """Build an HTTP scoring server around a saved model.
+
+    POST /predict takes a JSON object (one row) or a list of objects and returns the predicted probability and
+    class for each; GET /metrics returns latency and throughput statistics.
+
+    :param bundle: dict - model and features list, as returned by `src.train_model.load_model`
+    :param host: str - interface to listen on
+    :param port: int - port to listen on; 0 picks a free port
+    :param max_batch_size: int - most requests scored together
+    :param max_wait_ms: float - longest a request waits for more requests to join its batch
+    :param timeout: float - seconds a request waits for its result before failing
+    :param threshold: float - predict the positive class where its probability is above this
+    :param engine: str - inference engine, see `src.predict_model.predict`; the model is flattened once, here
+    :return: :obj: http.server.HTTPServer - server handling each request in a thread, with a `batcher` attribute
+    """
+    bundle = dict(bundle, model=flatten_model(bundle['model'], engine))
+    batcher = MicroBatcher(lambda rows: predict(bundle, rows, batch_size=max_batch_size, threshold=threshold),
+                           max_batch_size, max_wait_ms)
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._reply(200, batcher.stats.summary())
+            elif self.path == '/health':
+                self._reply(200, {'status': 'ok'})
+            else:
+                self._reply(404, {'error': f'Unknown path {self.path}.'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._reply(404, {'error': f'Unknown path {self.path}.'})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rows = [check_row(row, bundle['features_list']) for row in (body if isinstance(body, list) else [body])]
+                futures = [batcher.submit(row) for row in rows]
+                results = [future.result(timeout) for future in futures]
+            except (ValueError, KeyError) as e:
+                self._reply(400, {'error': str(e)})
+                return
+            except FutureTimeoutError:
+                self._reply(504, {'error': f'Scoring took longer than {timeout} seconds.'})
+                return
+            except Exception as e:
+                logger.exception('Scoring failed.')
+                self._reply(500, {'error': f'Scoring failed: {e}'})
+                return
+            self._reply(200, results if isinstance(body, list) else results[0])
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload, default=float).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    # http.server.ThreadingHTTPServer, which is the same, needs python 3.7
+    class Server(socketserver.ThreadingMixIn, HTTPServer):
+        # concurrent single-row clients are the point of micro-batching, so allow a deep accept queue
+        request_queue_size = 1024
+        daemon_threads = True
+
+    server = Server((host, port), Handler)
+    server.batcher = batcher
+    return server
+
+
+def serve(bundle: dict, **kwargs) -> None:
+    """Run the HTTP scoring server until interrupted.
+
+    :param bundle: dict - model and features list, as returned by `src.train_model.load_model`
+    :param kwargs: dict - server settings, see `make_server`
+    :return: None
+    """
+    server = make_server(bundle, **kwargs)
+    logger.info('Serving predictions on http://%s:%s.', *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+        logger.info(f'Scoring stats: {server.batcher.stats.summary()}')
@@ -0,0 +1,79 @@
+import numpy as np
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit, KFold, ShuffleSplit, StratifiedKFold, \
+    StratifiedShuffleSplit
+
+from src.profiling import profiled
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@profiled
+def split_indices(y: np.ndarray, test_size: float, seed: int = 42, stratify: bool = False,
+                  groups: np.ndarray = None) -> tuple:
+    """Split rows into a train and a test set, returning row indices rather than copies of the data.
+
+    :param y: :obj: numpy array or pandas series - labels, one per row
+    :param test_size: float or int - if float, it needs to be between 0-1 and represents proportion
+                                     of data in test set; if int, it represents number of data points
+                                     in test set (of groups, if `groups` is given)
+    :param seed: int - random state for the split
+    :param stratify: bool - if True, keep the class proportions of `y` in both sets; ignored if `groups` is given
+    :param groups: :obj: numpy array - optional group of each row (e.g. the source cloud block); every row of a
+                                       group goes to the same set
+    :return: tuple - train and test row indices, each in ascending order so that gathering the rows from a
+                     (memory-mapped) feature matrix reads it front to back
+    """
+    y = np.asarray(y)
+    if groups is not None:
+        splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=seed)
+    elif stratify:
+        splitter = StratifiedShuffleSplit(n_splits=1, test_size=test_size, random_state=seed)
+    else:
+        splitter = ShuffleSplit(n_splits=1, test_size=test_size, random_state=seed)
+    train_idx, test_idx = next(splitter.split(np.empty((len(y), 0)), y, groups))
+    if groups is not None:
+        _check_classes(y, train_idx, test_idx)
+
+    return np.sort(train_idx), np.sort(test_idx)
+
+
+def kfold_indices(y: np.ndarray, n_splits: int = 5, seed: int = 42, stratify: bool = True,
+                  groups: np.ndarray = None) -> list:
+    """Split rows into cross-validation folds, returning row indices rather than copies of the data.
+
+    :param y: :obj: numpy array or pandas series - labels, one per row
+    :param n_splits: int - number of folds
+    :param seed: int - random state for shuffling the rows into folds; group folds are not shuffled
+    :param stratify: bool - if True, keep the class proportions of `y` in every fold; ignored if `groups` is given
+    :param groups: :obj: numpy array - optional group of each row (e.g. the source cloud block); every row of a
+                                       group goes to the same fold
+    :return: list - one (train row indices, test row indices) tuple per fold, each in ascending order
+    """
+    y = np.asarray(y)
+    if groups is not None:
+        splitter = GroupKFold(n_splits=n_splits)
+    elif stratify:
+        splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    else:
+        splitter = KFold(n_splits=n_splits, shuffle=True, random_state=seed)
+
+    folds = [(np.sort(train_idx), np.sort(test_idx))
+             for train_idx, test_idx in splitter.split(np.empty((len(y), 0)), y, groups)]
+    if groups is not None:
+        for train_idx, test_idx in folds:
+            _check_classes(y, train_idx, test_idx)
+
+    return folds
+
+
+def _check_classes(y, train_idx, test_idx):
+    # whole groups can leave a class out of one side, e.g. if every group holds a single class, and the model can
+    # then neither learn nor be scored on it
+    classes = np.unique(y)
+    for name, idx in [('train', train_idx), ('test', test_idx)]:
+        missing = np.setdiff1d(classes, y[idx])
+        if len(missing):
+            raise ValueError(f"Splitting by group leaves no rows of class {missing.tolist()} in the {name} set; "
+                             f"group the rows by a column whose groups hold rows of several classes.")
@@ -1,51 +1,168 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split as tts
-from sklearn.ensemble import RandomForestClassifier
-
-import logging
-
-logger2 = logging.getLogger(__name__)
-
-
-def train_test_split(features: pd.DataFrame, target: pd.DataFrame, seed: int, test_size: int) -> tuple:
-    """split train test sets.
-
-    :param features: :obj: pandas dataframe - csv of features
-    :param target: :obj: pandas dataframe - csv of labels
-    :param seed: int - random state for train test split
-    :param test_size: float or int - if float, it needs to be between 0-1 and represents proportion
-                                     of data in test set; if int, it represents number of data points
-                                     in test set
-    :return:
-        :obj: tuple - tuple of pandas dataframes consisting of features and labels divided into train
-                      and test sets
-    """
-    X_train, X_test, y_train, y_test = tts(features, target, random_state=seed, test_size=test_size)
-
-    return X_train, X_test, y_train, y_test
-
-
-def fit_model(X_train: pd.DataFrame, labels: pd.DataFrame, X_test: pd.DataFrame,
-              features_list: list, **kwargs) -> pd.DataFrame:
-    """fit a random forest model based on custom sklearn parameters and make prediction on test set.
-
-    :param X_train: :obj: pandas dataframe - training features
-    :param labels:  :obj: pandas dataframe - training labels
-    :param X_test: :obj: pandas dataframe - test features
-    :param features_list: list - list of strings, features to use in the model
-    :param kwargs: dict - parameters compatible with sklearn RandomForestClassifier organized in a dictionary. See
-                          https://scikit-learn.org/stable/modules/generated/sklearn.ensemble.RandomForestClassifier.html
-                          for details.
-    :return: :obj: pandas dataframe - dataframe consisting of predictions on test set
-    """
-    rf = RandomForestClassifier(**kwargs)
-    rf.fit(X_train[features_list], labels)
-
-    ypred_proba = rf.predict_proba(X_test[features_list])[:, 1]
-    ypred_bin = rf.predict(X_test[features_list])
-
-    df = pd.DataFrame(ypred_proba, columns=['ypred_proba'])
-    df['ypred_bin'] = ypred_bin
-    logger2.info(f'Predictions df created.')
-
-    return df
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from src.profiling import profiled, record_io
+from src.schema import feature_matrix
+from src.splitting import split_indices
+
+import logging
+
+logger2 = logging.getLogger(__name__)
+
+
+@profiled
+def train_test_split(features: pd.DataFrame, target: pd.DataFrame, seed: int, test_size: int,
+                     stratify: bool = False) -> tuple:
+    """split train test sets.
+
+    The pipeline splits with `src.splitting.split_indices` and gathers the rows it needs instead.
+
+    :param features: :obj: pandas dataframe or numpy array - csv of features
+    :param target: :obj: pandas dataframe or numpy array - csv of labels
+    :param seed: int - random state for train test split
+    :param test_size: float or int - if float, it needs to be between 0-1 and represents proportion
+                                     of data in test set; if int, it represents number of data points
+                                     in test set
+    :param stratify: bool - if True, keep the class proportions of `target` in both sets
+    :return:
+        :obj: tuple - tuple of pandas dataframes (or numpy arrays) consisting of features and labels divided
+                      into train and test sets, rows in their original order and with their original index
+    """
+    train_idx, test_idx = split_indices(target, test_size, seed, stratify)
+
+    def take(data, idx):
+        return data.iloc[idx] if isinstance(data, (pd.DataFrame, pd.Series)) else data[idx]
+
+    return take(features, train_idx), take(features, test_idx), take(target, train_idx), take(target, test_idx)
+
+
+@profiled
+def fit_model(X_train, labels, X_test, features_list: list, model_path: str = None, threshold: float = 0.5,
+              **kwargs) -> pd.DataFrame:
+    """fit a random forest model based on custom sklearn parameters and make prediction on test set.
+
+    :param X_train: :obj: numpy array or pandas dataframe - training features; an array must hold the columns of
+                                                            `features_list` in order, see `src.schema.feature_matrix`
+    :param labels:  :obj: numpy array or pandas series - training labels
+    :param X_test: :obj: numpy array or pandas dataframe - test features, laid out like `X_train`
+    :param features_list: list - list of strings, features to use in the model
+    :param model_path: str - if given, save the fitted model there, see `save_model`
+    :param threshold: float - predict the positive class where its probability is above this
+    :param kwargs: dict - parameters compatible with sklearn RandomForestClassifier organized in a dictionary. See
+                          https://scikit-learn.org/stable/modules/generated/sklearn.ensemble.RandomForestClassifier.html
+                          for details.
+    :return: :obj: pandas dataframe - dataframe consisting of predictions on test set
+    """
+    if isinstance(X_train, pd.DataFrame):
+        X_train = feature_matrix(X_train, features_list)
+    if isinstance(X_test, pd.DataFrame):
+        X_test = feature_matrix(X_test, features_list)
+
+    rf = RandomForestClassifier(**kwargs)
+    # a plain float32 array has no feature names for the saved model to check, and it is the dtype the trees are
+    # built in, so it is passed on without a copy
+    rf.fit(X_train, labels)
+    if model_path is not None:
+        # every input row has now been seen, so incremental updates start after them
+        save_model(rf, features_list, model_path, rows_seen=len(X_train) + len(X_test))
+
+    ypred_proba, ypred_bin = predict_scores(rf, X_test, threshold)
+    df = pd.DataFrame({'ypred_proba': ypred_proba, 'ypred_bin': ypred_bin}, copy=False)
+    logger2.info(f'Predictions df created.')
+
+    return df
+
+
+def predict_scores(model: RandomForestClassifier, X: np.ndarray, threshold: float = 0.5) -> tuple:
+    """Predict the positive class probability and the class from a single pass over the trees.
+
+    At the default threshold of 0.5 the classes match `model.predict`.
+
+    :param model: :obj: sklearn RandomForestClassifier or `src.tree_inference.FlatForest` - fitted binary model
+    :param X: :obj: numpy array - float32 features, see `src.schema.feature_matrix`
+    :param threshold: float - predict the positive class where its probability is above this
+    :return: tuple - numpy arrays of the positive class probability and the predicted class
+    """
+    if not 0 <= threshold <= 1:
+        raise ValueError(f"Decision threshold must be between 0 and 1, got {threshold}.")
+    proba = model.predict_proba(X)[:, 1]
+    return proba, model.classes_[(proba > threshold).astype(np.intp)]
+
+
+def save_model(model: RandomForestClassifier, features_list: list, path: str, rows_seen: int = None,
+               tree_batches: list = None) -> None:
+    """Save a fitted model together with the features it expects and its incremental training state.
+
+    The model is stored uncompressed so that `load_model` can memory-map its tree arrays. It is written to a
+    temporary file first and then moved into place, so processes that have the old file mapped keep working.
+
+    :param model: :obj: sklearn RandomForestClassifier - fitted model
+    :param features_list: list - list of strings, features the model was fitted on
+    :param path: str - output path
+    :param rows_seen: int - number of leading input rows the model has been trained on
+    :param tree_batches: list - number of trees added by each training batch, oldest first
+    :return: None
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    bundle = {'model': model, 'features_list': list(features_list), 'rows_seen': rows_seen,
+              'tree_batches': tree_batches if tree_batches is not None else [len(model.estimators_)]}
+    joblib.dump(bundle, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    record_io('written', path)
+    logger2.info(f'Model saved to {path}.')
+
+
+def load_model(path: str, mmap_mode: str = 'r') -> dict:
+    """Load a model saved by `save_model`.
+
+    :param path: str - model path
+    :param mmap_mode: str - numpy memory-map mode for the tree arrays, or None to read them into memory
+    :return: dict - 'model' (fitted RandomForestClassifier), 'features_list', 'rows_seen' and 'tree_batches'
+    """
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def update_model(bundle: dict, features: pd.DataFrame, labels: pd.Series, n_estimators: int,
+                 window: int = None) -> dict:
+    """Grow a saved forest with trees fitted only on input rows it has not seen yet.
+
+    The input is expected to be an append-only archive: rows before `bundle['rows_seen']` were used by earlier
+    fits and are skipped, so an update costs time in proportion to the new rows only.
+
+    :param bundle: dict - model and training state, as returned by `load_model`
+    :param features: :obj: pandas dataframe - all features in the archive
+    :param labels: :obj: pandas series - all labels in the archive
+    :param n_estimators: int - number of trees to fit on the new rows
+    :param window: int - if given, keep only the trees of the most recent `window` batches
+    :return: dict - updated model and training state
+    """
+    rf, rows_seen = bundle['model'], bundle['rows_seen']
+    if rows_seen is None:
+        raise ValueError("The saved model does not record which rows it was trained on; retrain it first.")
+    X_new = features[bundle['features_list']].iloc[rows_seen:].to_numpy(dtype=np.float32)
+    y_new = labels.iloc[rows_seen:]
+
+    if len(y_new) == 0:
+        logger2.info('No new rows to train on.')
+        return bundle
+    if set(y_new.unique()) != set(rf.classes_):
+        # trees fitted on a subset of the classes cannot be averaged with the existing ones
+        logger2.warning(f'New rows only contain classes {sorted(y_new.unique())}; waiting for more data.')
+        return bundle
+
+    rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + n_estimators)
+    rf.fit(X_new, y_new)
+    tree_batches = bundle['tree_batches'] + [n_estimators]
+    if window is not None and len(tree_batches) > window:
+        dropped = sum(tree_batches[:-window])
+        rf.estimators_ = rf.estimators_[dropped:]
+        rf.set_params(n_estimators=len(rf.estimators_))
+        tree_batches = tree_batches[-window:]
+    logger2.info(f'Added {n_estimators} trees fitted on {len(y_new)} new rows; forest has {len(rf.estimators_)}.')
+
+    return dict(bundle, model=rf, rows_seen=rows_seen + len(y_new), tree_batches=tree_batches)
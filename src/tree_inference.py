@@ -0,0 +1,171 @@
+import functools
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ['sklearn', 'numpy', 'numba']
+
+
+class FlatForest:
+    """A fitted random forest flattened into one set of node arrays for fast scoring.
+
+    The nodes of every tree are concatenated into flat feature, threshold, child and leaf value arrays, with
+    leaves pointing to themselves. Rows are scored either by the 'numpy' engine, which walks every row down every
+    tree at once one level per step, or by the optional 'numba' engine, a compiled kernel that walks each row down
+    each tree in parallel across rows. Both compare the float32 features with the thresholds and add up the trees
+    in the same order as sklearn, so the probabilities match `RandomForestClassifier.predict_proba` exactly. As in
+    the pinned sklearn, features must be finite: there is no rule for sending missing values down a tree.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, max_depth: int, classes: np.ndarray, engine: str = 'numpy',
+                 block_size: int = 16384):
+        """
+        :param feature: :obj: numpy array - feature index each node splits on (0 for leaves)
+        :param threshold: :obj: numpy array - float64 split thresholds; rows with feature <= threshold go left
+        :param left: :obj: numpy array - node id of each node's left child; a leaf's own id
+        :param right: :obj: numpy array - node id of each node's right child; a leaf's own id
+        :param value: :obj: numpy array - n_nodes x n_classes class probabilities of each node
+        :param roots: :obj: numpy array - node id of each tree's root, in the forest's tree order
+        :param max_depth: int - depth of the deepest tree
+        :param classes: :obj: numpy array - class labels, as in `RandomForestClassifier.classes_`
+        :param engine: str - 'numpy' or 'numba' (which needs numba installed)
+        :param block_size: int - number of rows the 'numpy' engine walks down the trees at a time
+        """
+        if engine not in ENGINES[1:]:
+            raise ValueError(f"Unknown inference engine '{engine}'. Choose one of {ENGINES[1:]}.")
+        if engine == 'numba':
+            # fail here rather than at the first batch if numba is missing
+            _numba_kernel()
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.engine = engine
+        self.block_size = block_size
+        # both children of a node side by side, so a step down the trees is one gather
+        self._children = np.stack([left, right], axis=1).ravel()
+
+    @classmethod
+    def from_model(cls, model, engine: str = 'numpy', block_size: int = 16384) -> 'FlatForest':
+        """Flatten the trees of a fitted sklearn forest.
+
+        :param model: :obj: sklearn RandomForestClassifier - fitted single-output model
+        :param engine: str - 'numpy' or 'numba', see `FlatForest`
+        :param block_size: int - number of rows the 'numpy' engine walks down the trees at a time
+        :return: :obj: FlatForest - the same forest as node arrays
+        """
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if trees and trees[0].n_outputs != 1:
+            raise ValueError("Only single-output forests can be flattened.")
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        feature, threshold, left, right, value = [], [], [], [], []
+        for offset, tree in zip(offsets, trees):
+            ids = np.arange(tree.node_count) + offset
+            leaf = tree.children_left == -1
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            left.append(np.where(leaf, ids, tree.children_left + offset))
+            right.append(np.where(leaf, ids, tree.children_right + offset))
+            # each tree votes with its leaf's class proportions, normalized as sklearn's trees do
+            proba = tree.value[:, 0, :len(model.classes_)]
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(proba / normalizer)
+
+        def concat(arrays, dtype):
+            return np.ascontiguousarray(np.concatenate(arrays), dtype=dtype) if arrays else np.empty(0, dtype)
+
+        return cls(concat(feature, np.intp), concat(threshold, np.float64), concat(left, np.intp),
+                   concat(right, np.intp),
+                   np.concatenate(value) if value else np.empty((0, len(model.classes_))),
+                   np.asarray(offsets[:-1], dtype=np.intp), max((tree.max_depth for tree in trees), default=0),
+                   np.asarray(model.classes_), engine, block_size)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Predict class probabilities, averaged over the trees.
+
+        :param X: :obj: numpy array - finite features, in the columns the forest was fitted on; cast to float32
+                                      like sklearn does
+        :return: :obj: numpy array - n_rows x n_classes float64 probabilities
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN, infinity or a value too large for dtype('float32').")
+        out = np.zeros((len(X), self.value.shape[1]), dtype=np.float64)
+        if len(self.roots) == 0:
+            return out
+        if self.engine == 'numba':
+            _numba_kernel()(X, self.feature, self.threshold, self.left, self.right, self.value, self.roots, out)
+        else:
+            for start in range(0, len(X), self.block_size):
+                self._score_block(X[start:start + self.block_size], out[start:start + self.block_size])
+        out /= len(self.roots)
+        return out
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict the most probable class.
+
+        :param X: :obj: numpy array - features, see `predict_proba`
+        :return: :obj: numpy array - class labels
+        """
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def _score_block(self, X, out):
+        n_rows, n_columns = X.shape
+        # one entry per (tree, row) pair, tree by tree; flat gathers are much cheaper than 2-D fancy indexing
+        nodes = np.repeat(self.roots, n_rows)
+        offsets = np.tile(np.arange(n_rows) * n_columns, len(self.roots))
+        features = X.ravel()
+        # leaves point to themselves, so every pair can take max_depth steps
+        for _ in range(self.max_depth):
+            go_right = features.take(offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self._children.take(2 * nodes + go_right)
+        # add the trees up one at a time, in sklearn's order, so the sums round the same way
+        for tree_nodes in nodes.reshape(len(self.roots), n_rows):
+            out += self.value[tree_nodes]
+
+
+def flatten_model(model, engine: str = 'sklearn'):
+    """Get the model to score with for an inference engine.
+
+    :param model: :obj: sklearn RandomForestClassifier or FlatForest - fitted model
+    :param engine: str - 'sklearn' to score with the model as it is, or 'numpy' or 'numba' to flatten it,
+                         see `FlatForest`
+    :return: the model, or a FlatForest of it
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine '{engine}'. Choose one of {ENGINES}.")
+    if engine == 'sklearn' or isinstance(model, FlatForest):
+        return model
+    forest = FlatForest.from_model(model, engine)
+    logger.info(f'Flattened {len(forest.roots)} trees into {len(forest.feature)} nodes for the {engine} engine.')
+    return forest
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernel():
+    # numba is optional and compiling takes a moment, so the kernel is only built when first asked for
+    import numba
+
+    @numba.njit(parallel=True, nogil=True)
+    def score(X, feature, threshold, left, right, value, roots, out):
+        for i in numba.prange(X.shape[0]):
+            for tree in range(roots.shape[0]):
+                node = roots[tree]
+                while left[node] != node:
+                    if X[i, feature[node]] <= threshold[node]:
+                        node = left[node]
+                    else:
+                        node = right[node]
+                for j in range(value.shape[1]):
+                    out[i, j] += value[node, j]
+
+    return score
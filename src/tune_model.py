@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+import yaml
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score, accuracy_score
+from sklearn.model_selection import ParameterGrid
+
+from src.profiling import profiled
+from src.schema import feature_matrix
+from src.splitting import kfold_indices
+from src.train_model import predict_scores
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _fit_fold(X: np.ndarray, y: np.ndarray, train_idx: np.ndarray, test_idx: np.ndarray, params: dict) -> dict:
+    """Fit one parameter set on one fold and score it on the held-out rows."""
+    rf = RandomForestClassifier(**params)
+    rf.fit(X[train_idx], y[train_idx])
+    proba, pred = predict_scores(rf, X[test_idx])
+    return {'auc': roc_auc_score(y[test_idx], proba), 'accuracy': accuracy_score(y[test_idx], pred)}
+
+
+@profiled
+def tune(features: pd.DataFrame, labels: pd.Series, features_list: list, param_grid: dict, model_params: dict = None,
+         n_splits: int = 5, seed: int = 42, n_jobs: int = -1, groups: np.ndarray = None) -> pd.DataFrame:
+    """Cross-validate every combination of a random forest parameter grid in parallel.
+
+    The feature matrix and the fold indices are built once; joblib memory-maps the matrix into a shared file
+    so worker processes read the same pages instead of each receiving a copy.
+
+    :param features: :obj: pandas dataframe - features
+    :param labels: :obj: pandas series - labels
+    :param features_list: list - list of strings, features to use in the model
+    :param param_grid: dict - parameter name -> list of values to try, see sklearn ParameterGrid
+    :param model_params: dict - fixed RandomForestClassifier parameters (e.g. random_state, n_jobs) shared by
+                                every candidate
+    :param n_splits: int - number of cross-validation folds, stratified on the labels unless `groups` is given
+    :param seed: int - random state for shuffling the folds
+    :param n_jobs: int - number of worker processes; -1 uses all cores
+    :param groups: :obj: numpy array - optional group of each row; every row of a group goes to the same fold,
+                                       see `src.splitting.kfold_indices`
+    :return: :obj: pandas dataframe - one row per parameter set with its position in the grid ('candidate') and
+                                       mean/std AUC and accuracy, ranked by AUC
+    """
+    X = feature_matrix(features, features_list)
+    y = np.ascontiguousarray(labels.to_numpy())
+    folds = kfold_indices(y, n_splits, seed, groups=groups)
+    candidates = [dict(model_params or {}, **params) for params in ParameterGrid(param_grid)]
+    logger.info(f'Cross-validating {len(candidates)} parameter sets on {n_splits} folds.')
+
+    scores = Parallel(n_jobs=n_jobs, max_nbytes='1M', mmap_mode='r')(
+        delayed(_fit_fold)(X, y, train_idx, test_idx, params)
+        for params in candidates for train_idx, test_idx in folds)
+
+    rows = []
+    for i, params in enumerate(ParameterGrid(param_grid)):
+        fold_scores = pd.DataFrame(scores[i * n_splits:(i + 1) * n_splits])
+        rows.append(dict(params, candidate=i, mean_auc=fold_scores['auc'].mean(), std_auc=fold_scores['auc'].std(),
+                         mean_accuracy=fold_scores['accuracy'].mean(),
+                         std_accuracy=fold_scores['accuracy'].std()))
+    results = pd.DataFrame(rows).sort_values('mean_auc', ascending=False, kind='mergesort')
+    results.insert(0, 'rank', np.arange(1, len(results) + 1))
+
+    return results.reset_index(drop=True)
+
+
+def best_params(results: pd.DataFrame, param_grid: dict) -> dict:
+    """Pick the parameters of the top ranked row of a `tune` results table.
+
+    :param results: :obj: pandas dataframe - output of `tune`
+    :param param_grid: dict - the parameter grid that was searched
+    :return: dict - parameter name -> best value
+    """
+    # look the values up in the grid rather than the table, where pandas may have turned e.g. [5, None] into floats
+    return ParameterGrid(param_grid)[int(results['candidate'].iloc[0])]
+
+
+def save_params(params: dict, path: str) -> None:
+    """Write parameters to a yaml file.
+
+    :param params: dict - parameter name -> value
+    :param path: str - output path
+    :return: None
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        yaml.safe_dump(params, f)
+    logger.info(f'Best parameters saved to {path}.')
+
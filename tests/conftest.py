@@ -0,0 +1,63 @@
+import pytest
+import yaml
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from src.feature_generation import generate_features
+from src.train_model import save_model
+
+columns = ['visible_mean', 'visible_max', 'visible_min', 'visible_mean_distribution',
+           'visible_contrast', 'visible_entropy', 'visible_second_angular_momentum',
+           'IR_mean', 'IR_max', 'IR_min']
+features_list = ['log_entropy', 'IR_norm_range', 'entropy_x_contrast']
+
+
+def write_raw(path, blocks):
+    """Write a raw text file laid out like the UCI cloud.data file."""
+    lines = ['1. Title: Cloud data\n', '\n', '   Number of attributes: 10 "quoted" text\n']
+    for i, block in enumerate(blocks):
+        lines.append(f'   Cloud {i + 1} data:\n')
+        lines.append('\n')
+        lines += [''.join('%12.6f' % v for v in row) + '\n' for row in block]
+        lines.append('\n')
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+
+def make_raw(path, n_rows=60):
+    """Write a raw text file of two cloud blocks of `n_rows` random rows each."""
+    rng = np.random.RandomState(0)
+    base = np.array([3.0, 140.0, 43.5, 0.0833, 862.8417, 0.0254, 3.889, 163.0, 240.0, 213.3555])
+    blocks = [base * rng.uniform(0.8, 1.2, (n_rows, len(base))) * (1 + 0.1 * i) for i in range(2)]
+    write_raw(path, blocks)
+
+
+def make_data(n_rows=200):
+    """Draw input columns and labels that depend on them."""
+    rng = np.random.RandomState(0)
+    base = np.array([3.0, 140.0, 43.5, 0.0833, 862.8417, 0.0254, 3.889, 163.0, 240.0, 213.3555])
+    data = pd.DataFrame(base * rng.uniform(0.5, 1.5, (n_rows, len(base))), columns=columns)
+    labels = (data['visible_entropy'] * data['visible_contrast'] > 21).astype(float)
+    return data, labels
+
+
+@pytest.fixture
+def config():
+    with open("config/config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+    # keep the tests from writing a model or metrics into data/
+    config['train_model'].pop('save_model')
+    config['evaluate_model'].pop('metrics_path')
+    return config
+
+
+@pytest.fixture
+def bundle_path(tmp_path):
+    data, labels = make_data()
+    rf = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=42)
+    rf.fit(generate_features(data, features_list)[features_list].to_numpy(), labels)
+    path = str(tmp_path / 'model.joblib')
+    save_model(rf, features_list, path)
+    return path
@@ -0,0 +1,133 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.artifacts import ArtifactWriter, iter_artifact, open_matrix, read_artifact, resolve_format, \
+    write_artifact
+from src.schema import apply_schema
+
+data = pd.DataFrame(
+    columns=['visible_mean', 'visible_entropy', 'IR_mean', 'log_entropy', 'class'],
+    data=[
+        [3.0, 0.0254, 163.0, -3.673006104957646, 0.0],
+        [3.0, 0.0259, 167.0, -3.653512310276645, 0.0],
+        [2.0, 0.0684, 174.0, -2.682382454353632, 1.0],
+        [4.0, 0.0243, 155.0, -3.7172789286356345, 1.0]
+    ]
+)
+
+
+def test_resolve_format_happy():
+    assert resolve_format('data/featurized.csv') == 'csv'
+    assert resolve_format('data/featurized.feather') == 'feather'
+    assert resolve_format('data/featurized') == 'csv'
+    assert resolve_format('data/featurized.csv', 'npy') == 'npy'
+    assert resolve_format('data/features.mmap') == 'matrix'
+
+
+def test_resolve_format_unhappy():
+    with pytest.raises(ValueError):
+        resolve_format('data/featurized.csv', 'xlsx')
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'matrix'])
+def test_write_read_artifact_happy(tmp_path, fmt):
+    path = str(tmp_path / 'featurized')
+    write_artifact(data, path, fmt)
+
+    assert_frame_equal(data, read_artifact(path, fmt))
+
+
+@pytest.mark.parametrize('fmt', ['feather', 'parquet'])
+def test_write_read_artifact_arrow(tmp_path, fmt):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'featurized')
+    write_artifact(data, path, fmt)
+
+    assert_frame_equal(data, read_artifact(path, fmt))
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'matrix'])
+def test_artifact_writer_chunks(tmp_path, fmt):
+    path = str(tmp_path / 'featurized')
+    writer = ArtifactWriter(path, fmt)
+    writer.write(data.iloc[:3])
+    writer.write(data.iloc[3:])
+    writer.close()
+
+    assert_frame_equal(data, read_artifact(path, fmt))
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'matrix', 'feather', 'parquet'])
+def test_iter_artifact_chunks(tmp_path, fmt):
+    if fmt in ['feather', 'parquet']:
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'featurized')
+    write_artifact(data, path, fmt)
+
+    chunks = list(iter_artifact(path, fmt, chunksize=3))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert_frame_equal(data, pd.concat(chunks, ignore_index=True))
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'npy', 'matrix'])
+def test_artifact_schema_happy(tmp_path, fmt):
+    schema = {'visible_mean': np.float32, 'visible_entropy': np.float32, 'IR_mean': np.float32,
+              'log_entropy': np.float32, 'class': np.int8}
+    path = str(tmp_path / 'featurized')
+    write_artifact(data, path, fmt)
+
+    # csv would infer float64 and int64; the schema parses it straight into float32 and int8
+    expected = apply_schema(data, schema)
+    assert_frame_equal(expected, read_artifact(path, fmt, schema))
+    assert_frame_equal(expected, pd.concat(iter_artifact(path, fmt, chunksize=3, schema=schema)))
+
+    write_artifact(data, path, fmt, schema)
+    assert list(read_artifact(path, fmt, schema).dtypes) == [np.float32] * 4 + [np.int8]
+
+
+def test_artifact_writer_unhappy(tmp_path):
+    writer = ArtifactWriter(str(tmp_path / 'featurized.npy'))
+    writer.write(data)
+    with pytest.raises(ValueError):
+        writer.write(data.drop('class', axis=1))
+
+
+def test_read_artifact_npy_is_memory_mapped(tmp_path):
+    path = str(tmp_path / 'featurized.npy')
+    write_artifact(data['log_entropy'], path)
+
+    column = np.load(str(tmp_path / 'featurized.npy' / '0.npy'), mmap_mode='r')
+    assert isinstance(column, np.memmap)
+    np.testing.assert_array_equal(read_artifact(path)['log_entropy'].values, data['log_entropy'].values)
+
+
+def test_open_matrix_happy(tmp_path):
+    path = str(tmp_path / 'features.mmap')
+    write_artifact(data.astype({'class': np.int8}), path)
+
+    X, y, meta = open_matrix(path)
+    assert isinstance(X, np.memmap) and X.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(X, data.drop('class', axis=1).to_numpy())
+    np.testing.assert_array_equal(y, data['class'])
+    assert meta['columns'] == ['visible_mean', 'visible_entropy', 'IR_mean', 'log_entropy']
+    assert (meta['dtype'], meta['label_dtype'], meta['rows']) == ('float64', 'int8', 4)
+
+    # the dataframe read from the matrix is a view of the memory map
+    column = read_artifact(path)['log_entropy'].to_numpy()
+    while column is not None and not isinstance(column, np.memmap):
+        column = column.base
+    assert column is not None
+    np.testing.assert_array_equal(open_matrix(path, ['log_entropy', 'IR_mean'])[0], data[['log_entropy', 'IR_mean']])
+
+
+def test_open_matrix_unhappy(tmp_path):
+    path = str(tmp_path / 'features.mmap')
+    write_artifact(data, path)
+
+    with pytest.raises(KeyError):
+        open_matrix(path, ['log_entropy', 'IR_range'])
+    with pytest.raises(ValueError):
+        write_artifact(data[['class']], str(tmp_path / 'labels.mmap'))
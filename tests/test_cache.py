@@ -0,0 +1,212 @@
+import os
+import time
+
+import yaml
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import run
+from src import pipeline
+from src.artifacts import open_matrix, write_artifact
+from src.cache import StepCache, hash_file, step_key
+from src.train_model import load_model
+from tests.conftest import make_raw
+
+
+def test_step_key_happy():
+    key = step_key('train', 'abc', {'n_estimators': 10}, 'code')
+
+    assert key == step_key('train', 'abc', {'n_estimators': 10}, 'code')
+    assert key != step_key('train', 'abc', {'n_estimators': 11}, 'code')
+    assert key != step_key('train', 'abd', {'n_estimators': 10}, 'code')
+    assert key != step_key('train', 'abc', {'n_estimators': 10}, 'edoc')
+
+
+def test_hash_file_happy(tmp_path):
+    (tmp_path / 'a.csv').write_text('x\n1\n')
+    (tmp_path / 'b.csv').write_text('x\n1\n')
+    (tmp_path / 'c.csv').write_text('x\n2\n')
+
+    assert hash_file(tmp_path / 'a.csv') == hash_file(tmp_path / 'b.csv')
+    assert hash_file(tmp_path / 'a.csv') != hash_file(tmp_path / 'c.csv')
+
+
+def test_step_cache_happy(tmp_path):
+    cache = StepCache(tmp_path / 'cache')
+    data = pd.DataFrame({'x': [1.0, 2.0]})
+
+    assert cache.get('key') is None
+    cache.put('key', data)
+    assert_frame_equal(data, cache.get('key'))
+
+    (tmp_path / 'out.csv').write_text('x\n1\n')
+    assert not cache.get_file('file', tmp_path / 'restored.csv')
+    cache.put_file('file', tmp_path / 'out.csv')
+    assert cache.get_file('file', tmp_path / 'restored.csv')
+    assert (tmp_path / 'restored.csv').read_text() == 'x\n1\n'
+
+
+def test_step_cache_disabled(tmp_path):
+    cache = StepCache(tmp_path / 'cache', enabled=False)
+    cache.put('key', 1)
+
+    assert cache.get('key') is None
+    assert not os.path.exists(tmp_path / 'cache')
+
+
+def test_step_cache_evicts_least_recently_used(tmp_path):
+    cache = StepCache(tmp_path / 'cache', max_size_mb=2.5 / 1024)
+    for key in ['a', 'b']:
+        cache.put(key, b'x' * 1024)
+        time.sleep(0.01)
+    # reading 'a' makes 'b' the least recently used entry
+    cache.get('a')
+    time.sleep(0.01)
+    cache.put('c', b'x' * 1024)
+
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+
+
+def test_run_pipeline_reuses_features_when_model_params_change(tmp_path, config, monkeypatch):
+    path = tmp_path / 'cloud.data'
+    make_raw(path)
+    cache = StepCache(tmp_path / 'cache')
+    pipeline.run_pipeline(path, config, cache=cache)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('step should have been served from the cache')
+
+    monkeypatch.setattr(pipeline, 'read', fail)
+    monkeypatch.setattr(pipeline, 'featurize', fail)
+    model_config = dict(config['train_model'], model_params=dict(config['train_model']['model_params'],
+                                                                 n_estimators=5))
+    pipeline.run_pipeline(path, dict(config, train_model=model_config), cache=cache)
+
+
+def with_trees(base, n_estimators, model_path):
+    model_config = dict(base['train_model'], model_params=dict(base['train_model']['model_params'],
+                                                               n_estimators=n_estimators),
+                        save_model={'path': str(model_path)})
+    return dict(base, train_model=model_config)
+
+
+def test_run_pipeline_restores_saved_model(tmp_path, config, caplog):
+    caplog.set_level('INFO')
+    path = tmp_path / 'cloud.data'
+    make_raw(path)
+    cache = StepCache(tmp_path / 'cache')
+    model_path = tmp_path / 'model.joblib'
+
+    # the third run is a cache hit and must leave the model of its own config behind, not the one run before it
+    for n_estimators in [10, 3, 10]:
+        pipeline.run_pipeline(path, with_trees(config, n_estimators, model_path), cache=cache)
+        assert len(load_model(model_path)['model'].estimators_) == n_estimators
+    assert f'restored {model_path}' in caplog.text
+
+
+def test_run_train_restores_saved_model(tmp_path, config, caplog):
+    caplog.set_level('INFO')
+    make_raw(tmp_path / 'cloud.data')
+    model_path = tmp_path / 'model.joblib'
+    data = pipeline.featurize(pipeline.read(tmp_path / 'cloud.data', config['load_data']), config['generate_features'],
+                              config['train_model']['fit_model']['features_list'], save_snapshots=False)
+    write_artifact(data, tmp_path / 'featurized.csv')
+
+    for n_estimators in [10, 3, 10]:
+        run_config = dict(with_trees(config, n_estimators, model_path), cache={'dir': str(tmp_path / 'cache')})
+        with open(tmp_path / 'config.yaml', 'w') as f:
+            yaml.safe_dump(run_config, f)
+        run.main(['train', f'--input={tmp_path / "featurized.csv"}', f'--output={tmp_path / "predictions.csv"}',
+                  f'--config={tmp_path / "config.yaml"}'])
+        assert len(load_model(model_path)['model'].estimators_) == n_estimators
+    assert 'Step train skipped' in caplog.text
+
+
+def run_featurize(config, tmp_path, input_path, feature_config, features_list=None):
+    run_config = dict(config, generate_features=feature_config, cache={'dir': str(tmp_path / 'cache')})
+    if features_list is not None:
+        run_config['train_model'] = dict(config['train_model'], fit_model=dict(config['train_model']['fit_model'],
+                                                                               features_list=features_list))
+    with open(tmp_path / 'config.yaml', 'w') as f:
+        yaml.safe_dump(run_config, f)
+    run.main(['featurize', f'--input={input_path}', f'--output={tmp_path / "featurized.csv"}',
+              f'--config={tmp_path / "config.yaml"}'])
+
+
+def test_run_featurize_restores_snapshots(tmp_path, config, caplog):
+    caplog.set_level('INFO')
+    inputs = []
+    for i in range(2):
+        make_raw(tmp_path / f'cloud_{i}.data', n_rows=40 + i)
+        inputs.append(tmp_path / f'cloud_{i}.csv')
+        write_artifact(pipeline.read(tmp_path / f'cloud_{i}.data', config['load_data']), inputs[-1])
+    snapshot = tmp_path / 'ir_range.csv'
+    feature_config = {'feature_gen': {}, 'add_ir_range': {'output_path': str(snapshot)}}
+
+    # the snapshot left by a cache hit is that of the hit's own input, not of the run before it
+    expected = []
+    for i in [0, 1, 0]:
+        run_featurize(config, tmp_path, inputs[i], feature_config)
+        expected.append(snapshot.read_text())
+    assert 'Step featurize skipped' in caplog.text
+    assert expected[2] == expected[0] != expected[1]
+
+
+def test_run_featurize_hits_without_labels_path(tmp_path, config, caplog):
+    caplog.set_level('INFO')
+    make_raw(tmp_path / 'cloud.data')
+    write_artifact(pipeline.read(tmp_path / 'cloud.data', config['load_data']), tmp_path / 'cloud.csv')
+    # a features path without a labels path writes no snapshot, so there is nothing to wait for on a rerun
+    feature_config = {'feature_gen': {'features_output_path': str(tmp_path / 'features.csv')}}
+
+    for _ in range(2):
+        run_featurize(config, tmp_path, tmp_path / 'cloud.csv', feature_config)
+    assert 'Step featurize skipped' in caplog.text
+    assert not (tmp_path / 'features.csv').exists()
+
+
+def test_run_pipeline_restores_snapshots(tmp_path, config):
+    cache = StepCache(tmp_path / 'cache')
+    snapshot = tmp_path / 'ir_range.csv'
+    run_config = dict(config, pipeline={}, generate_features={'feature_gen': {},
+                                                              'add_ir_range': {'output_path': str(snapshot)}})
+
+    expected = []
+    for i in [0, 1, 0]:
+        make_raw(tmp_path / f'cloud_{i}.data', n_rows=40 + i)
+        pipeline.run_pipeline(tmp_path / f'cloud_{i}.data', run_config, save_intermediate=True, cache=cache)
+        expected.append(snapshot.read_text())
+    assert expected[2] == expected[0] != expected[1]
+
+
+def test_run_featurize_restores_matrix(tmp_path, config, caplog):
+    caplog.set_level('INFO')
+    make_raw(tmp_path / 'cloud.data')
+    write_artifact(pipeline.read(tmp_path / 'cloud.data', config['load_data']), tmp_path / 'cloud.csv')
+    matrix_path = tmp_path / 'features.mmap'
+    feature_config = {'feature_gen': {'matrix_output_path': str(matrix_path)}}
+    features_list = config['train_model']['fit_model']['features_list']
+
+    for features in [features_list, features_list[:1], features_list]:
+        run_featurize(config, tmp_path, tmp_path / 'cloud.csv', feature_config, features)
+        assert open_matrix(matrix_path)[2]['columns'] == features
+    assert 'Step featurize skipped' in caplog.text
+
+
+def test_cache_key_covers_step_code(config, monkeypatch):
+    hashed = {}
+
+    def code_version(*modules):
+        hashed[step] = [module.__name__ for module in modules]
+        return 'code'
+
+    monkeypatch.setattr(pipeline, 'code_version', code_version)
+    for step in ['read', 'featurize', 'train']:
+        pipeline.cache_key(step, 'input', config)
+
+    # the schema sets the dtypes every step reads and writes, and train splits with src.splitting
+    assert all('src.schema' in modules and 'src.pipeline' in modules for modules in hashed.values())
+    assert 'src.splitting' in hashed['train']
@@ -0,0 +1,178 @@
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+import yaml
+
+import numpy as np
+
+from src.data_acquisition import detect_blocks, download_file, download_files, load_data, make_session
+from tests.conftest import write_raw
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+    data_config = config['load_data']
+
+first_cloud = [
+    [3.0, 140.0, 43.5, 0.0833, 862.8417, 0.0254, 3.889, 163.0, 240.0, 213.3555],
+    [3.0, 135.0, 41.9063, 0.079, 690.3291, 0.0259, 3.834, 167.0, 239.0, 213.7188],
+    [2.0, 126.0, 21.0586, 0.0406, 308.3583, 0.0684, 3.1702, 174.0, 240.0, 227.5859]
+]
+second_cloud = [
+    [4.0, 197.0, 77.4805, 0.089, 874.4709, 0.0243, 3.9442, 155.0, 239.0, 197.2773],
+    [7.0, 193.0, 88.8398, 0.0884, 810.1126, 0.0223, 3.9318, 150.0, 236.0, 186.0195]
+]
+
+
+class Server(socketserver.ThreadingMixIn, HTTPServer):
+    # what http.server.ThreadingHTTPServer is, which needs python 3.7
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    """Local stand-in for the data host, serving fixed files with an ETag and byte-range support."""
+    files = {'/a.data': b'first cloud file\n' * 1000, '/b.data': b'second cloud file\n' * 1000}
+    state = {'requests': [], 'failures': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            state['requests'].append((self.path, dict(self.headers)))
+            if state['failures'] > 0:
+                state['failures'] -= 1
+                self.send_response(503)
+                self.end_headers()
+                return
+            if self.path not in files:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body, etag = files[self.path], f'"{len(files[self.path])}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            status, start = 200, 0
+            if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+                status, start = 206, int(self.headers['Range'][len('bytes='):-1])
+            self.send_response(status)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body) - start))
+            self.end_headers()
+            self.wfile.write(body[start:])
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%d' % httpd.server_address[1], files, state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_files_happy(server, tmp_path):
+    url, files, state = server
+
+    results = download_files([url + '/a.data', url + '/b.data'], tmp_path, max_workers=2, chunk_size=1024)
+    assert results == {url + '/a.data': True, url + '/b.data': True}
+    assert (tmp_path / 'a.data').read_bytes() == files['/a.data']
+    assert (tmp_path / 'b.data').read_bytes() == files['/b.data']
+    assert not (tmp_path / 'a.data.part').exists()
+
+    # unchanged files are skipped with a conditional request
+    results = download_files([url + '/a.data', url + '/b.data'], tmp_path)
+    assert results == {url + '/a.data': False, url + '/b.data': False}
+    assert all('If-None-Match' in headers for _, headers in state['requests'][2:])
+
+
+def test_download_file_resumes(server, tmp_path):
+    url, files, state = server
+    path = str(tmp_path / 'a.data')
+    # a download interrupted half way through
+    with open(path + '.part', 'wb') as f:
+        f.write(files['/a.data'][:5000])
+    with open(path + '.meta.json', 'w') as f:
+        json.dump({'url': url + '/a.data', 'etag': '"%d"' % len(files['/a.data']), 'complete': False}, f)
+
+    with make_session() as session:
+        assert download_file(session, url + '/a.data', path)
+    assert (tmp_path / 'a.data').read_bytes() == files['/a.data']
+    assert state['requests'][0][1]['Range'] == 'bytes=5000-'
+
+
+def test_download_file_retries(server, tmp_path):
+    url, files, state = server
+    state['failures'] = 2
+
+    with make_session() as session:
+        assert download_file(session, url + '/a.data', str(tmp_path / 'a.data'), attempt=3, backoff=0)
+    assert (tmp_path / 'a.data').read_bytes() == files['/a.data']
+    assert len(state['requests']) == 3
+
+
+def test_download_files_unhappy(server, tmp_path):
+    url, files, state = server
+    state['failures'] = 2
+
+    with pytest.raises(RuntimeError):
+        download_files([url + '/missing.data'], tmp_path, backoff=0)
+    # the 503s are retried, the 404 is not
+    assert len(state['requests']) == 3
+    with make_session() as session, pytest.raises(requests.exceptions.RetryError):
+        state['failures'] = 2
+        download_file(session, url + '/a.data', str(tmp_path / 'a.data'), attempt=2, backoff=0)
+    assert not (tmp_path / 'a.data').exists()
+
+
+def test_detect_blocks_happy(tmp_path):
+    path = tmp_path / 'cloud.data'
+    write_raw(path, [first_cloud, second_cloud])
+
+    blocks = detect_blocks(path, len(data_config['columns']), min_block_rows=2)
+    assert blocks == [[5, 8], [11, 13]]
+
+
+def test_detect_blocks_unhappy(tmp_path):
+    path = tmp_path / 'cloud.data'
+    write_raw(path, [first_cloud, second_cloud])
+
+    # neither cloud is long enough to count as a block
+    assert detect_blocks(path, len(data_config['columns']), min_block_rows=10) == []
+
+
+def test_load_data_happy(tmp_path):
+    path = tmp_path / 'cloud.data'
+    write_raw(path, [first_cloud, second_cloud])
+
+    data = load_data(path, data_config['columns'], chunksize=2, min_block_rows=2)
+
+    assert list(data.columns) == data_config['columns'] + ['class']
+    assert (data[data_config['columns']].dtypes == np.float32).all() and data['class'].dtype == np.int8
+    np.testing.assert_array_equal(data[data_config['columns']].values,
+                                  np.array(first_cloud + second_cloud, dtype=np.float32))
+    np.testing.assert_array_equal(data['class'].values, [0, 0, 0, 1, 1])
+
+
+def test_load_data_blocks_from_config(tmp_path):
+    path = tmp_path / 'cloud.data'
+    write_raw(path, [first_cloud, second_cloud])
+
+    data = load_data(path, data_config['columns'], blocks=[[6, 8], [11, 12]])
+
+    np.testing.assert_array_equal(data[data_config['columns']].values,
+                                  np.array(first_cloud[1:] + second_cloud[:1], dtype=np.float32))
+    np.testing.assert_array_equal(data['class'].values, [0, 0, 1])
+
+
+def test_load_data_unhappy(tmp_path):
+    path = tmp_path / 'cloud.data'
+    write_raw(path, [])
+
+    with pytest.raises(ValueError):
+        load_data(path, data_config['columns'])
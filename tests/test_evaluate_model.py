@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score, confusion_matrix
+
+from src.evaluate_model import StreamingEvaluator, evaluation, evaluate_chunks, save_metrics
+
+
+def make_predictions(n_rows=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    y = rng.randint(0, 2, n_rows).astype(np.int8)
+    # a forest of 10 trees predicts tenths, so many rows share a probability
+    proba = np.clip(np.round(0.3 * y + rng.uniform(0, 0.7, n_rows), 1), 0, 1)
+    return pd.DataFrame({'ypred_proba': proba, 'ypred_bin': (proba > 0.5).astype(np.int8), 'class': y})
+
+
+def test_streaming_evaluator_happy():
+    pred = make_predictions()
+    evaluator = StreamingEvaluator(thresholds=[0.5, 0.0, 0.35, 1.0])
+    for start in range(0, len(pred), 300):
+        chunk = pred.iloc[start:start + 300]
+        evaluator.update(chunk['class'], chunk['ypred_proba'], chunk['ypred_bin'])
+    metrics = evaluator.metrics()
+
+    assert metrics['rows'] == 1000
+    assert metrics['auc'] == pytest.approx(roc_auc_score(pred['class'], pred['ypred_proba']), abs=1e-12)
+    assert metrics['confusion_matrix'] == confusion_matrix(pred['class'], pred['ypred_bin']).tolist()
+    assert metrics['accuracy'] == pytest.approx((pred['class'] == pred['ypred_bin']).mean())
+
+    table = pd.DataFrame(metrics['thresholds'])
+    assert list(table['threshold']) == [0.0, 0.35, 0.5, 1.0]
+    for row in metrics['thresholds']:
+        predicted = pred['ypred_proba'] > row['threshold']
+        assert row['tp'] == (predicted & (pred['class'] == 1)).sum()
+        assert row['fp'] == (predicted & (pred['class'] == 0)).sum()
+        assert row['tn'] + row['fn'] == (~predicted).sum()
+    # the 0.5 threshold reproduces the predicted classes
+    half = metrics['thresholds'][2]
+    assert [[half['tn'], half['fp']], [half['fn'], half['tp']]] == metrics['confusion_matrix']
+    # nothing is predicted positive above 1, so precision is undefined
+    assert metrics['thresholds'][3]['precision'] is None
+
+
+def test_streaming_evaluator_unhappy():
+    evaluator = StreamingEvaluator()
+    with pytest.raises(ValueError):
+        evaluator.update(np.array([0, 2]), np.array([0.1, 0.9]))
+
+    # a single class has no AUC
+    evaluator.update(np.array([1, 1]), np.array([0.1, 0.9]))
+    assert evaluator.metrics()['auc'] is None
+
+
+def test_evaluate_chunks_matches_evaluation(tmp_path):
+    pred = make_predictions()
+    metrics = evaluation(pred['class'], pred)
+    chunked = evaluate_chunks(pred.iloc[start:start + 128] for start in range(0, len(pred), 128))
+
+    assert metrics == chunked
+    save_metrics(metrics, tmp_path / 'metrics' / 'evaluation.json')
+    with open(tmp_path / 'metrics' / 'evaluation.json') as f:
+        assert json.load(f) == metrics
@@ -0,0 +1,79 @@
+import pytest
+import yaml
+
+import pandas as pd
+
+from src.experiments import apply_overrides, build_dag, experiment_config, run_experiments
+from src.pipeline import run_pipeline
+from src.train_model import load_model
+from tests.conftest import make_raw
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+    # keep the tests from writing metrics or cache entries into the repository
+    config['evaluate_model'].pop('metrics_path')
+    config['cache']['enabled'] = False
+
+experiments = {
+    'baseline': {},
+    'deeper_trees': {'train_model.model_params.max_depth': 3},
+    'two_features': {'train_model': {'fit_model': {'features_list': ['log_entropy', 'IR_norm_range']}}}
+}
+
+
+def test_apply_overrides_happy():
+    overridden = apply_overrides(config, {'train_model.model_params.max_depth': 3,
+                                          'train_model': {'train_test_split': {'test_size': 0.5}}})
+
+    assert overridden['train_model']['model_params'] == dict(config['train_model']['model_params'], max_depth=3)
+    assert overridden['train_model']['train_test_split'] == dict(config['train_model']['train_test_split'],
+                                                                 test_size=0.5)
+    # the base config is left as it is
+    assert config['train_model']['model_params']['max_depth'] == 10
+
+
+def test_build_dag_shares_steps(tmp_path):
+    make_raw(tmp_path / 'cloud.data')
+    configs = {name: experiment_config(config, overrides) for name, overrides in experiments.items()}
+
+    nodes, leaves = build_dag(tmp_path / 'cloud.data', configs)
+
+    steps = pd.Series([node['step'] for node in nodes.values()]).value_counts()
+    # one read; the deeper trees share the baseline's features; every experiment trains and evaluates
+    assert steps.to_dict() == {'train': 3, 'evaluate': 3, 'featurize': 2, 'read': 1}
+    assert sorted(leaves) == sorted(experiments)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_run_experiments_happy(tmp_path, n_jobs):
+    make_raw(tmp_path / 'cloud.data')
+
+    results = run_experiments(tmp_path / 'cloud.data', config, experiments, n_jobs=n_jobs)
+
+    assert sorted(results['experiment']) == sorted(experiments)
+    assert list(results['auc']) == sorted(results['auc'], reverse=True)
+    assert 'train_model.fit_model.features_list' in results
+    # each experiment scores as the pipeline does on its own config
+    pred = run_pipeline(tmp_path / 'cloud.data', experiment_config(config, experiments['deeper_trees']))
+    accuracy = (pred['ypred_bin'] == pred['class']).mean()
+    assert results.set_index('experiment').loc['deeper_trees', 'accuracy'] == pytest.approx(accuracy)
+
+
+def test_run_experiments_restores_saved_model(tmp_path):
+    make_raw(tmp_path / 'cloud.data')
+    cached = dict(config, cache={'enabled': True, 'dir': str(tmp_path / 'cache')})
+    model_path = tmp_path / 'model.joblib'
+
+    # the last run's train step is a cache hit, and must still leave its own model behind
+    for n_estimators in [10, 3, 10]:
+        run_experiments(tmp_path / 'cloud.data', cached, {'saved': {
+            'train_model.save_model.path': str(model_path),
+            'train_model.model_params.n_estimators': n_estimators}}, n_jobs=1)
+        assert len(load_model(model_path)['model'].estimators_) == n_estimators
+
+
+def test_run_experiments_unhappy(tmp_path):
+    make_raw(tmp_path / 'cloud.data')
+
+    with pytest.raises(ValueError):
+        run_experiments(tmp_path / 'cloud.data', config, {})
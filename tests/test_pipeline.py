@@ -0,0 +1,109 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.artifacts import open_matrix, read_artifact, write_artifact
+from src.pipeline import read, featurize, featurize_stream, train, train_matrix, run_pipeline
+from src.schema import build_schema
+from tests.conftest import make_raw
+
+
+def test_run_pipeline_matches_steps(tmp_path, config):
+    path = tmp_path / 'cloud.data'
+    make_raw(path)
+
+    data = read(path, config['load_data'])
+    data = featurize(data, config['generate_features'], config['train_model']['fit_model']['features_list'],
+                     save_snapshots=False)
+    pred_steps = train(data, config['train_model'])
+
+    pred_all = run_pipeline(path, config)
+    assert_frame_equal(pred_steps, pred_all)
+
+
+def test_train_keeps_row_ids(tmp_path, config):
+    make_raw(tmp_path / 'cloud.data')
+    data = featurize(read(tmp_path / 'cloud.data', config['load_data']), config['generate_features'],
+                     config['train_model']['fit_model']['features_list'], save_snapshots=False)
+    data['cloud'] = np.arange(len(data)) // 10
+
+    pred = train(data, dict(config['train_model'], group_column='cloud'))
+
+    # the predictions join back to their input rows by row id
+    np.testing.assert_array_equal(data['class'].iloc[pred['row_id']], pred['class'])
+    assert not set(data['cloud'].iloc[pred['row_id']]) & set(data['cloud'].drop(pred['row_id']))
+
+    with pytest.raises(ValueError):
+        train_matrix(data[config['train_model']['fit_model']['features_list']].to_numpy(), data['class'].to_numpy(),
+                     dict(config['train_model'], group_column='cloud'))
+    # each class is one block of the raw file, so grouping by it leaves a class out of the training set
+    with pytest.raises(ValueError):
+        train(data, dict(config['train_model'], group_column='class'))
+
+
+def test_run_pipeline_writes_only_when_asked(tmp_path, config):
+    path = tmp_path / 'cloud.data'
+    make_raw(path)
+    pipeline_config = dict(config, pipeline={'read': {'output_path': str(tmp_path / 'cloud.csv')}},
+                           generate_features={step: {} for step in config['generate_features']})
+
+    run_pipeline(path, pipeline_config)
+    assert not (tmp_path / 'cloud.csv').exists()
+
+    run_pipeline(path, pipeline_config, save_intermediate=True)
+    assert (tmp_path / 'cloud.csv').exists()
+
+
+def snapshot_config(config, tmp_path, prefix):
+    feature_config = {step: {'output_path': str(tmp_path / f'{prefix}_{step}.csv')}
+                      for step in config['generate_features'] if step != 'feature_gen'}
+    feature_config['feature_gen'] = {'features_output_path': str(tmp_path / f'{prefix}_features.csv'),
+                                     'labels_output_path': str(tmp_path / f'{prefix}_labels.csv'),
+                                     'matrix_output_path': str(tmp_path / f'{prefix}_matrix.mmap')}
+    return feature_config
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_featurize_stream_matches_featurize(tmp_path, config, n_jobs):
+    make_raw(tmp_path / 'cloud.data')
+    schema = build_schema(config['load_data']['columns'])
+    write_artifact(read(tmp_path / 'cloud.data', config['load_data']), tmp_path / 'cloud.csv', schema=schema)
+    features_list = config['train_model']['fit_model']['features_list']
+
+    # both modes are called the way run.py calls them, with the schema built from the config
+    memory = featurize(read_artifact(tmp_path / 'cloud.csv', schema=schema),
+                       snapshot_config(config, tmp_path, 'memory'), features_list, schema=schema)
+    write_artifact(memory, tmp_path / 'memory.csv', schema=schema)
+    n_rows = featurize_stream(tmp_path / 'cloud.csv', tmp_path / 'stream.csv',
+                              snapshot_config(config, tmp_path, 'stream'), features_list, chunksize=7, n_jobs=n_jobs,
+                              schema=schema)
+
+    assert n_rows == 120
+    assert (tmp_path / 'stream.csv').read_text() == (tmp_path / 'memory.csv').read_text()
+    for name in ['features', 'labels', 'add_log_entropy', 'add_ir_norm_range']:
+        assert (tmp_path / f'stream_{name}.csv').read_text() == (tmp_path / f'memory_{name}.csv').read_text()
+    for name in ['features.npy', 'labels.npy', 'meta.json']:
+        stream, memory = [(tmp_path / f'{prefix}_matrix.mmap' / name).read_bytes() for prefix in ['stream', 'memory']]
+        assert stream == memory
+
+
+def test_train_matrix_matches_train(tmp_path, config):
+    make_raw(tmp_path / 'cloud.data')
+    features_list = config['train_model']['fit_model']['features_list']
+    data = featurize(read(tmp_path / 'cloud.data', config['load_data']), snapshot_config(config, tmp_path, 'memory'),
+                     features_list)
+
+    X, y, meta = open_matrix(tmp_path / 'memory_matrix.mmap', features_list)
+    assert isinstance(X, np.memmap)
+    assert meta['columns'] == features_list and meta['dtype'] == 'float32'
+    assert_frame_equal(train_matrix(X, y, config['train_model']), train(data, config['train_model']))
+
+
+def test_featurize_stream_unhappy(tmp_path, config):
+    pd.DataFrame({'visible_mean': [1.0, 2.0]}).to_csv(tmp_path / 'cloud.csv', index=False)
+
+    with pytest.raises(KeyError):
+        featurize_stream(tmp_path / 'cloud.csv', tmp_path / 'stream.csv', config['generate_features'],
+                         config['train_model']['fit_model']['features_list'], save_snapshots=False, chunksize=1)
@@ -0,0 +1,52 @@
+import pytest
+
+import numpy as np
+from pandas.testing import assert_frame_equal
+from sklearn.ensemble import RandomForestClassifier
+
+from src.artifacts import open_matrix, write_artifact
+from src.feature_generation import generate_features
+from src.predict_model import predict
+from src.train_model import load_model
+from tests.conftest import make_data, features_list
+
+
+def test_load_model_happy(bundle_path):
+    bundle = load_model(bundle_path)
+    assert bundle['features_list'] == features_list
+    assert isinstance(bundle['model'], RandomForestClassifier)
+
+
+def test_predict_happy(bundle_path):
+    bundle = load_model(bundle_path)
+    data, _ = make_data(50)
+    features = generate_features(data, features_list)
+
+    pred = predict(bundle, features, batch_size=7, n_jobs=2)
+
+    X = features[features_list].to_numpy()
+    np.testing.assert_array_equal(pred['ypred_proba'].values, bundle['model'].predict_proba(X)[:, 1])
+    np.testing.assert_array_equal(pred['ypred_bin'].values, bundle['model'].predict(X))
+    # raw input columns are featurized on the fly
+    assert_frame_equal(pred, predict(bundle, data))
+
+
+def test_predict_matrix(bundle_path, tmp_path):
+    bundle = load_model(bundle_path)
+    data, _ = make_data(50)
+    features = generate_features(data, features_list)
+    write_artifact(features[features_list].astype(np.float32), str(tmp_path / 'features.mmap'))
+
+    # batches are scored straight from the memory-mapped matrix
+    X, _, _ = open_matrix(str(tmp_path / 'features.mmap'), features_list)
+    assert_frame_equal(predict(bundle, X, batch_size=7, n_jobs=2), predict(bundle, features))
+
+    with pytest.raises(ValueError):
+        predict(bundle, X[:, :2])
+
+
+def test_predict_unhappy(bundle_path):
+    bundle = load_model(bundle_path)
+    data, _ = make_data(5)
+    with pytest.raises(KeyError):
+        predict(bundle, data.drop('visible_entropy', axis=1))
@@ -0,0 +1,69 @@
+import json
+import pstats
+
+import numpy as np
+import pandas as pd
+
+from src import profiling
+from src.artifacts import write_artifact
+from src.pipeline import run_pipeline
+from tests.conftest import make_raw
+
+
+def test_profiler_stage_happy(tmp_path):
+    records = profiling.configure(tmp_path / 'metrics.jsonl', enabled=True).records
+    try:
+        with profiling.stage('outer', rows=4):
+            write_artifact(pd.DataFrame({'x': np.arange(4.0)}), tmp_path / 'out.csv')
+            with profiling.stage('inner') as record:
+                record['rows'] = 2
+    finally:
+        profiling.configure()
+
+    inner, outer = records
+    assert (inner['stage'], inner['parent'], inner['rows']) == ('inner', 'outer', 2)
+    assert (outer['stage'], outer['parent'], outer['rows']) == ('outer', None, 4)
+    assert outer['bytes_written'] == (tmp_path / 'out.csv').stat().st_size
+    assert inner['bytes_written'] == 0
+    assert outer['wall_s'] >= inner['wall_s'] >= 0
+    assert outer['peak_rss_mb'] > 0
+
+    with open(tmp_path / 'metrics.jsonl') as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['stage'] for line in lines] == ['inner', 'outer']
+
+
+def test_profiler_disabled(tmp_path):
+    profiler = profiling.configure(tmp_path / 'metrics.jsonl', enabled=False)
+    with profiling.stage('outer'):
+        profiling.record_io('read', __file__)
+
+    assert profiler.records == []
+    assert not (tmp_path / 'metrics.jsonl').exists()
+
+
+def test_unprofiled_worker(tmp_path):
+    profiling.configure(tmp_path / 'metrics.jsonl', enabled=True)
+    try:
+        # what a forked worker does with the profiler it inherited
+        assert not profiling.unprofiled(lambda: profiling.profiler.enabled)
+    finally:
+        profiling.configure()
+    assert not (tmp_path / 'metrics.jsonl').exists()
+
+
+def test_profiled_pipeline_happy(tmp_path, config):
+    make_raw(tmp_path / 'cloud.data')
+    records = profiling.configure(enabled=True).records
+    try:
+        with profiling.cprofile(tmp_path / 'all.prof'):
+            run_pipeline(tmp_path / 'cloud.data', config)
+    finally:
+        profiling.configure()
+
+    records = {record['stage']: record for record in records}
+    assert {'read', 'load_data', 'featurize', 'compute_features', 'train', 'fit_model', 'evaluate'} <= set(records)
+    assert records['load_data']['parent'] == 'read'
+    assert records['load_data']['bytes_read'] == (tmp_path / 'cloud.data').stat().st_size
+    assert records['read']['rows'] == records['featurize']['rows']
+    assert pstats.Stats(str(tmp_path / 'all.prof')).total_calls > 0
@@ -0,0 +1,112 @@
+import json
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+import run
+from src.artifacts import read_artifact
+from src.cache import hash_file
+from src.schema import build_schema
+from tests.conftest import make_raw
+
+# run a step in a fresh interpreter and report how long it took and which modules it imported
+RUN_STEP = """
+import json, sys, time
+start = time.perf_counter()
+import run
+run.main(sys.argv[1:])
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+"""
+
+# what every step used to import before running, whichever step it was
+IMPORT_ALL = """
+import json, time
+start = time.perf_counter()
+import pandas, requests, yaml
+import src.experiments, src.pipeline, src.predict_model, src.serve_model, src.train_model, src.tune_model
+print(json.dumps({'seconds': time.perf_counter() - start}))
+"""
+
+# modules a light step must not import, and the share of the time taken by importing everything it may take
+BUDGETS = {
+    'acquire': (['pandas', 'sklearn'], 0.25),
+    'read': (['sklearn'], 0.6),
+    'featurize': (['sklearn'], 0.6),
+    'evaluate': (['sklearn'], 0.6),
+}
+
+
+def start(*args):
+    # capture_output and text need python 3.7
+    result = subprocess.run([sys.executable, '-c', *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope='module')
+def workdir(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('run')
+    with open("config/config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+    config['acquire'] = {'urls': [], 'output_dir': str(tmp_path)}
+    config['cache']['enabled'] = False
+    config['profiling']['enabled'] = False
+    config['generate_features'] = {step: {} for step in config['generate_features']}
+    config['train_model'].pop('save_model')
+    config['evaluate_model'].pop('metrics_path')
+    with open(tmp_path / 'config.yaml', 'w') as f:
+        yaml.safe_dump(config, f)
+    make_raw(tmp_path / 'cloud.data')
+    return tmp_path
+
+
+def test_light_steps_start_fast(workdir):
+    reference = min(start(IMPORT_ALL)['seconds'] for _ in range(2))
+    config = f'--config={workdir / "config.yaml"}'
+    steps = [('acquire', config),
+             ('read', f'--input={workdir / "cloud.data"}', f'--output={workdir / "cloud.csv"}', config),
+             ('featurize', f'--input={workdir / "cloud.csv"}', f'--output={workdir / "featurized.csv"}', config),
+             ('train', f'--input={workdir / "featurized.csv"}', f'--output={workdir / "predictions.csv"}', config),
+             ('evaluate', f'--input={workdir / "predictions.csv"}', config)]
+
+    for step, *args in steps:
+        result = start(RUN_STEP, step, *args)
+        if step not in BUDGETS:
+            assert 'sklearn' in result['modules']
+            continue
+        forbidden, share = BUDGETS[step]
+        assert not [module for module in forbidden if module in result['modules']], step
+        # the first run may pay for cold disk reads, so the best of two is checked against the budget
+        seconds = min(result['seconds'], start(RUN_STEP, step, *args)['seconds'])
+        assert seconds < share * reference, f'{step} took {seconds:.2f}s, {seconds / reference:.0%} of a full import'
+
+
+def test_run_unhappy(workdir):
+    with pytest.raises(subprocess.CalledProcessError):
+        start(RUN_STEP, 'unknown', f'--config={workdir / "config.yaml"}')
+
+
+@pytest.mark.parametrize('output', ['featurized.csv', 'featurized.npy'])
+def test_featurize_output_follows_schema(workdir, tmp_path, output):
+    with open(workdir / 'config.yaml', 'r') as f:
+        config = yaml.safe_load(f)
+    schema = build_schema(config['load_data']['columns'])
+    run.main(['read', f'--input={workdir / "cloud.data"}', f'--output={tmp_path / "cloud.csv"}',
+              f'--config={workdir / "config.yaml"}'])
+
+    # the in-memory and the streaming featurize write the same columns, in schema order and dtypes
+    for mode, chunksize in [('memory', None), ('stream', 7)]:
+        config['stream_features'] = {'chunksize': chunksize, 'n_jobs': 1}
+        with open(tmp_path / f'{mode}.yaml', 'w') as f:
+            yaml.safe_dump(config, f)
+        run.main(['featurize', f'--input={tmp_path / "cloud.csv"}', f'--output={tmp_path / (mode + "_" + output)}',
+                  f'--config={tmp_path / f"{mode}.yaml"}'])
+
+    data = read_artifact(tmp_path / f'memory_{output}')
+    assert list(data.columns) == [column for column in schema if column in data.columns]
+    assert set(config['train_model']['fit_model']['features_list']) < set(data.columns)
+    if output.endswith('.npy'):
+        assert data.dtypes.to_dict() == {column: schema[column] for column in data.columns}
+    assert hash_file(tmp_path / f'memory_{output}') == hash_file(tmp_path / f'stream_{output}')
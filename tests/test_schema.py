@@ -0,0 +1,41 @@
+import yaml
+
+import numpy as np
+import pandas as pd
+
+from src.schema import apply_schema, build_schema
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+    columns = config['load_data']['columns']
+
+
+def test_build_schema_happy():
+    schema = build_schema(columns)
+
+    assert list(schema)[:len(columns)] == columns
+    assert list(schema)[-1] == 'class'
+    assert 'IR_norm_range' in schema
+    assert schema['class'] == np.int8
+    assert all(schema[name] == np.float32 for name in schema if name != 'class')
+
+
+def test_apply_schema_happy():
+    schema = build_schema(columns)
+    data = pd.DataFrame({'ypred_proba': [0.2, 0.9], 'class': [0.0, 1.0], 'log_entropy': [-3.5, -2.5],
+                         'IR_mean': np.array([163.0, 167.0], dtype=np.float32)})
+
+    conformed = apply_schema(data, schema)
+    assert list(conformed.columns) == ['IR_mean', 'log_entropy', 'class', 'ypred_proba']
+    assert list(conformed.dtypes) == [np.float32, np.float32, np.int8, np.float64]
+    # columns already in the schema dtype are not copied
+    assert np.shares_memory(conformed['IR_mean'].values, data['IR_mean'].values)
+    assert apply_schema(data['class'], schema).dtype == np.int8
+
+
+def test_apply_schema_unhappy():
+    schema = build_schema(columns)
+    data = pd.DataFrame({'ypred_bin': [0.0, 1.0]})
+
+    # data without schema columns is left as it is
+    assert apply_schema(data, schema) is data
@@ -0,0 +1,145 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import pandas as pd
+
+from src.feature_generation import generate_features
+from src.predict_model import predict
+from src.serve_model import LatencyStats, MicroBatcher, check_row, make_server
+from src.train_model import load_model
+from tests.conftest import make_data, features_list
+
+
+def test_latency_stats_happy():
+    stats = LatencyStats()
+    stats.record([0.001] * 98 + [0.5, 0.5])
+
+    summary = stats.summary()
+    assert summary['requests'] == 100
+    assert summary['mean_batch_size'] == 100
+    assert summary['p50_ms'] == pytest.approx(1.0)
+    assert summary['p99_ms'] == pytest.approx(500.0)
+
+
+def test_latency_stats_empty():
+    summary = LatencyStats().summary()
+    assert summary['requests'] == 0
+    assert summary['p50_ms'] is None
+
+
+def test_micro_batcher_happy():
+    batch_sizes = []
+
+    def score(rows):
+        batch_sizes.append(len(rows))
+        return pd.DataFrame({'double': rows['x'] * 2})
+
+    batcher = MicroBatcher(score, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit({'x': float(i)}) for i in range(10)]
+    results = [future.result(5) for future in futures]
+    batcher.close()
+
+    assert results == [{'double': 2.0 * i} for i in range(10)]
+    assert max(batch_sizes) == 4
+    assert sum(batch_sizes) == 10
+
+
+def test_micro_batcher_unhappy():
+    def score(rows):
+        if rows['x'].isnull().any():
+            raise KeyError('x')
+        return pd.DataFrame({'inverse': 1 / rows['x']})
+
+    batcher = MicroBatcher(score, max_batch_size=4, max_wait_ms=200)
+    good, bad = batcher.submit({'x': 2.0}), batcher.submit({'y': 1.0})
+    # the malformed row fails on its own without taking the rest of its batch down
+    assert good.result(5) == {'inverse': 0.5}
+    with pytest.raises(KeyError):
+        bad.result(5)
+    batcher.close()
+
+
+def test_micro_batcher_mixed_rows(bundle_path):
+    bundle = load_model(bundle_path)
+    data, _ = make_data(2)
+    featurized = generate_features(data, features_list)
+    expected = predict(bundle, data).to_dict('records')
+
+    # a raw row batched with a featurized one lacks the features the other row brings, and must not be scored on
+    # those missing cells
+    batcher = MicroBatcher(lambda rows: predict(bundle, rows), max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(featurized.iloc[0].to_dict()), batcher.submit(data.iloc[1].to_dict())]
+    assert [future.result(5) for future in futures] == expected
+    batcher.close()
+
+
+def test_check_row_unhappy():
+    data, _ = make_data(1)
+    row = data.iloc[0].to_dict()
+
+    assert check_row(row, features_list) == row
+    assert check_row(dict(row, log_entropy=None), features_list) == row
+    for incomplete in [dict(row, visible_entropy=None), {'log_entropy': 1.0}, [1.0, 2.0]]:
+        with pytest.raises(ValueError):
+            check_row(incomplete, features_list)
+
+
+def request(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    with urllib.request.urlopen(url, data=data, timeout=10) as response:
+        return json.loads(response.read())
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.1])
+def test_server_happy(bundle_path, threshold):
+    bundle = load_model(bundle_path)
+    server = make_server(bundle, port=0, max_batch_size=8, max_wait_ms=1, threshold=threshold)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://%s:%s' % server.server_address[:2]
+    try:
+        data, _ = make_data(5)
+        rows = data.to_dict('records')
+
+        single = request(url + '/predict', rows[0])
+        batch = request(url + '/predict', rows)
+        assert single == batch[0]
+        assert batch == predict(bundle, data, threshold=threshold).to_dict('records')
+
+        metrics = request(url + '/metrics')
+        assert metrics['requests'] == 6
+        assert metrics['p99_ms'] >= metrics['p50_ms']
+
+        # an incomplete row is rejected, whether it comes alone or with complete rows
+        for payload in [{'visible_mean': 1.0}, [rows[0], {'visible_mean': 1.0}]]:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                request(url + '/predict', payload)
+            assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
+
+
+# a broken model fails in a way the request is not to blame for
+@pytest.mark.parametrize('model, settings, status', [('saved', {'timeout': 0.01, 'max_wait_ms': 500}, 504),
+                                                     (None, {}, 500)])
+def test_server_unhappy(bundle_path, model, settings, status):
+    bundle = load_model(bundle_path)
+    if model is None:
+        bundle = dict(bundle, model=None)
+    server = make_server(bundle, port=0, **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://%s:%s' % server.server_address[:2]
+    try:
+        data, _ = make_data(1)
+        with pytest.raises(urllib.error.HTTPError) as error:
+            request(url + '/predict', data.iloc[0].to_dict())
+        assert error.value.code == status
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
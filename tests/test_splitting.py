@@ -0,0 +1,52 @@
+import pytest
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+
+from src.splitting import kfold_indices, split_indices
+
+y = np.array([0] * 70 + [1] * 30, dtype=np.int8)
+# ten groups of ten rows, each holding rows of both classes
+groups = np.tile(np.arange(10), 10)
+
+
+def test_split_indices_happy():
+    train_idx, test_idx = split_indices(y, test_size=0.4, seed=42, stratify=True)
+
+    assert len(test_idx) == 40
+    np.testing.assert_array_equal(np.sort(np.concatenate([train_idx, test_idx])), np.arange(len(y)))
+    assert (np.diff(train_idx) > 0).all() and (np.diff(test_idx) > 0).all()
+    # both sets keep the class proportions
+    assert y[test_idx].mean() == pytest.approx(0.3) and y[train_idx].mean() == pytest.approx(0.3)
+
+    train_idx, test_idx = split_indices(y, test_size=0.4, seed=42, groups=groups)
+    assert not set(groups[train_idx]) & set(groups[test_idx])
+
+
+def test_split_indices_unhappy():
+    with pytest.raises(ValueError):
+        split_indices(y, test_size=1.5)
+    # grouping by the label puts each class on one side only
+    with pytest.raises(ValueError):
+        split_indices(y, test_size=0.5, groups=y)
+
+
+def test_kfold_indices_happy():
+    folds = kfold_indices(y, n_splits=5, seed=42)
+
+    # the same folds as stratified k-fold, each row held out once
+    expected = StratifiedKFold(n_splits=5, shuffle=True, random_state=42).split(np.empty((len(y), 0)), y)
+    for (train_idx, test_idx), (expected_train, expected_test) in zip(folds, expected):
+        np.testing.assert_array_equal(train_idx, expected_train)
+        np.testing.assert_array_equal(test_idx, expected_test)
+    np.testing.assert_array_equal(np.sort(np.concatenate([test_idx for _, test_idx in folds])), np.arange(len(y)))
+
+    for train_idx, test_idx in kfold_indices(y, n_splits=5, groups=groups):
+        assert not set(groups[train_idx]) & set(groups[test_idx])
+
+
+def test_kfold_indices_unhappy():
+    with pytest.raises(ValueError):
+        kfold_indices(y, n_splits=20, groups=groups)
+    with pytest.raises(ValueError):
+        kfold_indices(y, n_splits=2, groups=y)
@@ -0,0 +1,112 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from src.feature_generation import generate_features
+from src.schema import feature_matrix
+from src.train_model import fit_model, predict_scores, save_model, load_model, update_model
+from tests.conftest import make_data, features_list
+
+
+@pytest.fixture
+def archive():
+    data, labels = make_data(300)
+    return generate_features(data, features_list), labels
+
+
+def test_fit_model_saves_training_state(tmp_path, archive):
+    features, labels = archive
+    path = str(tmp_path / 'model.joblib')
+
+    fit_model(features.iloc[:200], labels.iloc[:200], features.iloc[200:], features_list,
+              model_path=path, n_estimators=4, random_state=42)
+
+    bundle = load_model(path)
+    assert bundle['rows_seen'] == 300
+    assert bundle['tree_batches'] == [4]
+
+
+def test_fit_model_single_pass(archive, monkeypatch):
+    features, labels = archive
+    X = feature_matrix(features, features_list)
+    calls = []
+    predict_proba = RandomForestClassifier.predict_proba
+    monkeypatch.setattr(RandomForestClassifier, 'predict_proba',
+                        lambda self, X: calls.append(1) or predict_proba(self, X))
+
+    pred = fit_model(X[:200], labels.to_numpy()[:200], X[200:], features_list, n_estimators=4, random_state=42)
+
+    assert len(calls) == 1
+    rf = RandomForestClassifier(n_estimators=4, random_state=42).fit(X[:200], labels.to_numpy()[:200])
+    np.testing.assert_array_equal(pred['ypred_proba'], predict_proba(rf, X[200:])[:, 1])
+    np.testing.assert_array_equal(pred['ypred_bin'], rf.predict(X[200:]))
+    # dataframes give the same predictions as the materialized arrays
+    pred_df = fit_model(features.iloc[:200], labels.iloc[:200], features.iloc[200:], features_list,
+                        n_estimators=4, random_state=42)
+    pd.testing.assert_frame_equal(pred, pred_df)
+
+
+def test_predict_scores_threshold(archive):
+    features, labels = archive
+    X = feature_matrix(features, features_list)
+    rf = RandomForestClassifier(n_estimators=4, random_state=42).fit(X, labels)
+
+    proba, pred = predict_scores(rf, X, threshold=0.8)
+    np.testing.assert_array_equal(pred, np.where(proba > 0.8, rf.classes_[1], rf.classes_[0]))
+    assert (predict_scores(rf, X, threshold=1)[1] == rf.classes_[0]).all()
+
+    with pytest.raises(ValueError):
+        predict_scores(rf, X, threshold=1.5)
+
+
+def test_update_model_happy(tmp_path, archive):
+    features, labels = archive
+    rf = RandomForestClassifier(n_estimators=4, random_state=42)
+    rf.fit(features[features_list].iloc[:100].to_numpy(), labels.iloc[:100])
+    path = str(tmp_path / 'model.joblib')
+    save_model(rf, features_list, path, rows_seen=100)
+
+    bundle = update_model(load_model(path), features.iloc[:200], labels.iloc[:200], n_estimators=3)
+    assert bundle['rows_seen'] == 200
+    assert bundle['tree_batches'] == [4, 3]
+    assert len(bundle['model'].estimators_) == 7
+
+    # the new trees are fitted on the new rows only
+    expected = RandomForestClassifier(n_estimators=7, random_state=42, warm_start=True)
+    expected.set_params(n_estimators=4).fit(features[features_list].iloc[:100].to_numpy(), labels.iloc[:100])
+    expected.set_params(n_estimators=7).fit(features[features_list].iloc[100:200].to_numpy(), labels.iloc[100:200])
+    X = features[features_list].to_numpy()
+    np.testing.assert_array_equal(bundle['model'].predict_proba(X), expected.predict_proba(X))
+
+    # nothing new, nothing to do
+    assert update_model(bundle, features.iloc[:200], labels.iloc[:200], n_estimators=3) is bundle
+
+
+def test_update_model_window(archive):
+    features, labels = archive
+    rf = RandomForestClassifier(n_estimators=4, random_state=42)
+    rf.fit(features[features_list].iloc[:100].to_numpy(), labels.iloc[:100])
+    bundle = {'model': rf, 'features_list': features_list, 'rows_seen': 100, 'tree_batches': [4]}
+
+    bundle = update_model(bundle, features.iloc[:200], labels.iloc[:200], n_estimators=3, window=2)
+    bundle = update_model(bundle, features, labels, n_estimators=2, window=2)
+
+    assert bundle['tree_batches'] == [3, 2]
+    assert len(bundle['model'].estimators_) == 5
+    assert bundle['model'].predict_proba(features[features_list].to_numpy()).shape == (300, 2)
+
+
+def test_update_model_unhappy(archive):
+    features, labels = archive
+    rf = RandomForestClassifier(n_estimators=4, random_state=42)
+    rf.fit(features[features_list].iloc[:100].to_numpy(), labels.iloc[:100])
+    bundle = {'model': rf, 'features_list': features_list, 'rows_seen': 100, 'tree_batches': [4]}
+
+    # a batch with a single class is held back until more rows arrive
+    single_class = pd.Series(np.zeros(len(labels)), index=labels.index)
+    assert update_model(bundle, features, single_class, n_estimators=3) is bundle
+
+    with pytest.raises(ValueError):
+        update_model(dict(bundle, rows_seen=None), features, labels, n_estimators=3)
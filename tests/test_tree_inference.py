@@ -0,0 +1,73 @@
+import pytest
+
+import numpy as np
+from pandas.testing import assert_frame_equal
+from sklearn.ensemble import RandomForestClassifier
+
+from src.predict_model import predict
+from src.train_model import load_model
+from src.tree_inference import FlatForest, flatten_model
+from tests.conftest import make_data
+
+
+def make_forests():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(500, 4)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=0.5, size=500) > 0).astype(int)
+    # three classes, labelled with strings
+    y_multi = np.array(['a', 'b', 'c'])[y + (X[:, 3] > 1)]
+    forests = [RandomForestClassifier(n_estimators=10, max_depth=4, random_state=42).fit(X, y),
+               RandomForestClassifier(n_estimators=7, max_features=None, random_state=0).fit(X, y),
+               RandomForestClassifier(n_estimators=5, random_state=1).fit(X, y_multi)]
+    return X, forests
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'numba'])
+def test_flat_forest_matches_sklearn(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    X, forests = make_forests()
+    # unseen rows, a float64 copy and a ragged last block
+    X_new = np.random.RandomState(1).normal(size=(301, 4))
+
+    for rf in forests:
+        forest = FlatForest.from_model(rf, engine, block_size=64)
+        for rows in [X, X_new, X[:1]]:
+            np.testing.assert_array_equal(forest.predict_proba(rows), rf.predict_proba(rows))
+            np.testing.assert_array_equal(forest.predict(rows), rf.predict(rows))
+        assert forest.predict_proba(X[:0]).shape == (0, len(rf.classes_))
+
+
+@pytest.mark.filterwarnings('ignore:overflow encountered in cast')
+@pytest.mark.parametrize('value', [np.nan, np.inf, 1e39])
+def test_flat_forest_rejects_non_finite(value):
+    X, forests = make_forests()
+    X = X.astype(np.float64)
+    X[5, 2] = value
+
+    # sklearn 0.23, which the requirements pin, raises on these rather than route them down the trees
+    with pytest.raises(ValueError):
+        FlatForest.from_model(forests[0]).predict_proba(X)
+
+
+def test_predict_engine_happy(bundle_path):
+    bundle = load_model(bundle_path)
+    data, _ = make_data(50)
+
+    expected = predict(bundle, data)
+    assert_frame_equal(predict(bundle, data, batch_size=7, engine='numpy'), expected)
+    forest = flatten_model(bundle['model'], 'numpy')
+    assert flatten_model(forest, 'numpy') is forest
+    assert_frame_equal(predict(dict(bundle, model=forest), data), expected)
+
+
+def test_predict_engine_unhappy(bundle_path):
+    bundle = load_model(bundle_path)
+    data, _ = make_data(5)
+    with pytest.raises(ValueError):
+        predict(bundle, data, engine='cython')
+
+    X, _ = make_forests()
+    multi_output = RandomForestClassifier(n_estimators=2).fit(X, np.stack([X[:, 0] > 0, X[:, 1] > 0], axis=1))
+    with pytest.raises(ValueError):
+        FlatForest.from_model(multi_output)
@@ -0,0 +1,49 @@
+import pytest
+import yaml
+
+import pandas as pd
+
+from src.feature_generation import generate_features
+from src.pipeline import train_config
+from src.tune_model import tune, best_params, save_params
+from tests.conftest import make_data, features_list
+
+with open("config/config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+param_grid = {'n_estimators': [3, 5], 'max_depth': [2, None]}
+
+
+def test_tune_happy():
+    data, labels = make_data()
+    features = generate_features(data, features_list)
+
+    results = tune(features, labels, features_list, param_grid, {'random_state': 42}, n_splits=3, n_jobs=2)
+
+    assert len(results) == 4
+    assert list(results['rank']) == [1, 2, 3, 4]
+    assert results['mean_auc'].is_monotonic_decreasing
+    assert best_params(results, param_grid) in [{'n_estimators': n, 'max_depth': d}
+                                                for n in [3, 5] for d in [2, None]]
+    # results do not depend on how the folds are spread over workers
+    pd.testing.assert_frame_equal(results, tune(features, labels, features_list, param_grid, {'random_state': 42},
+                                                n_splits=3, n_jobs=1))
+
+
+def test_tune_unhappy():
+    data, labels = make_data()
+    with pytest.raises(KeyError):
+        tune(data, labels, features_list, param_grid)
+
+
+def test_train_config_uses_tuned_params(tmp_path):
+    path = str(tmp_path / 'best_params.yaml')
+    tuned_config = dict(config, tune_model=dict(config['tune_model'], best_params_path=path),
+                        train_model=dict(config['train_model'], use_tuned_params=True))
+
+    # no tuned parameters yet, so the configured ones are used
+    assert train_config(tuned_config)['model_params'] == config['train_model']['model_params']
+
+    save_params({'n_estimators': 50, 'max_depth': None}, path)
+    model_params = train_config(tuned_config)['model_params']
+    assert model_params == dict(config['train_model']['model_params'], n_estimators=50, max_depth=None)